@@ -1,37 +1,65 @@
+import re
+from typing import Tuple
+
+from app.core.enums import CryptoInfo, MessageFlag
+
 USERNAME_REGEX = r"^[A-Za-z][A-Za-z0-9_]{3,15}$"
 PASSWORD_REGEX = r"^(?=.*?[A-Z])(?=.*?[a-z])(?=.*?[0-9]).{8,32}$"
 BOT_TOKEN_REGEX = r"^[0-9]{8,10}:[A-Za-z0-9_-]{35}$"
 WEBHOOK_SECRET_REGEX = r"^[A-Za-z0-9_-]{1,256}$"
 
-MESSAGE_RETURNED_METHODS = {
-    "sendMessage",
-    "forwardMessage",
-    "sendPhoto",
-    "sendAudio",
-    "sendDocument",
-    "sendVideo",
-    "sendAnimation",
-    "sendVoice",
-    "sendVideoNote",
-    "sendPaidMedia",
-    "sendLocation",
-    "sendVenue",
-    "sendContact",
-    "sendPoll",
-    "sendChecklist",
-    "sendDice",
-    "sendSticker",
-    "sendInvoice",
-    "sendGame",
-}
+USERNAME_RE = re.compile(USERNAME_REGEX)
+PASSWORD_RE = re.compile(PASSWORD_REGEX)
+BOT_TOKEN_RE = re.compile(BOT_TOKEN_REGEX)
+WEBHOOK_SECRET_RE = re.compile(WEBHOOK_SECRET_REGEX)
+
+BOT_TOKEN_INFO: bytes = CryptoInfo.BOT_TOKEN.value
+WEBHOOK_TOKEN_INFO: bytes = CryptoInfo.WEBHOOK_TOKEN.value
+WEBHOOK_URL_INFO: bytes = CryptoInfo.WEBHOOK_URL.value
+WEBHOOK_REDIRECT_TOKEN_INFO: bytes = CryptoInfo.WEBHOOK_REDIRECT_TOKEN.value
+
+MESSAGE_RETURNED_METHODS = frozenset(
+    {
+        "sendMessage",
+        "forwardMessage",
+        "sendPhoto",
+        "sendAudio",
+        "sendDocument",
+        "sendVideo",
+        "sendAnimation",
+        "sendVoice",
+        "sendVideoNote",
+        "sendPaidMedia",
+        "sendLocation",
+        "sendVenue",
+        "sendContact",
+        "sendPoll",
+        "sendChecklist",
+        "sendDice",
+        "sendSticker",
+        "sendInvoice",
+        "sendGame",
+    }
+)
+
+EDITED_MESSAGE_RETURNED_METHODS = frozenset(
+    {
+        "editMessageText",
+        "editMessageCaption",
+        "editMessageMedia",
+        "editMessageLiveLocation",
+        "stopMessageLiveLocation",
+        "editMessageChecklist",
+        "editMessageReplyMarkup",
+        "setGameScore",
+    }
+)
 
-EDITED_MESSAGE_RETURNED_METHODS = {
-    "editMessageText",
-    "editMessageCaption",
-    "editMessageMedia",
-    "editMessageLiveLocation",
-    "stopMessageLiveLocation",
-    "editMessageChecklist",
-    "editMessageReplyMarkup",
-    "setGameScore",
-}
+MESSAGE_FLAG_FIELDS: Tuple[Tuple[str, MessageFlag], ...] = (
+    ("is_topic_message", MessageFlag.IS_TOPIC_MESSAGE),
+    ("is_automatic_forward", MessageFlag.IS_AUTOMATIC_FORWARD),
+    ("has_media_spoiler", MessageFlag.HAS_MEDIA_SPOILER),
+    ("has_protected_content", MessageFlag.HAS_PROTECTED_CONTENT),
+    ("is_from_offline", MessageFlag.IS_FROM_OFFLINE),
+    ("is_paid_post", MessageFlag.IS_PAID_POST),
+)
@@ -1,44 +1,142 @@
+import hashlib
 import os
-from typing import Optional
+import platform
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
+from cryptography.hazmat.backends.openssl.backend import backend
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import hashes, hmac
+from fastapi.concurrency import run_in_threadpool
 
+from app.core.enums import CryptoInfo
+from app.core.logger import logger
 from app.core.settings import settings
 
 
+def _read_cpu_flags() -> Set[str]:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+
+    return set()
+
+
+def check_crypto_backend() -> None:
+    logger.info(f"Crypto backend: {backend.openssl_version_text()}")
+
+    if platform.machine() not in ("x86_64", "AMD64"):
+        return
+
+    missing = {"aes", "pclmulqdq"} - _read_cpu_flags()
+    if missing:
+        logger.warning(
+            f"CPU flags missing: {', '.join(sorted(missing))}. "
+            "AES-GCM falls back to a slow software implementation"
+        )
+
+
+class _NonceSource(threading.local):
+    def __init__(self, size: int = 1200) -> None:
+        self._size = size
+        self._buffer = b""
+        self._offset = 0
+        self._pid = 0
+
+    def next12(self) -> bytes:
+        # Refill after fork as well, so worker processes never share nonces
+        if self._offset + 12 > len(self._buffer) or self._pid != os.getpid():
+            self._buffer = os.urandom(self._size)
+            self._offset = 0
+            self._pid = os.getpid()
+
+        nonce = self._buffer[self._offset : self._offset + 12]
+        self._offset += 12
+
+        return nonce
+
+
 class Crypto:
+    __slots__ = ("_token", "_salt", "_nonces", "_keys", "_ciphers")
+
     def __init__(self, token: str, salt: Optional[str]) -> None:
         self._token = token.encode()
         self._salt = salt.encode() if salt else None
+        self._nonces = _NonceSource()
+        self._keys = self._derive_keys()
+        self._ciphers: Dict[bytes, AESGCM] = {
+            info: AESGCM(key) for info, key in self._keys.items()
+        }
 
-    def get_aes_master_key(self, info: bytes) -> bytes:
-        hkdf = HKDF(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self._salt,
-            info=info,
-        )
+    def _derive_keys(self) -> Dict[bytes, bytes]:
+        # HKDF-SHA256 (RFC 5869): one Extract, then a single-block Expand per label
+        extract = hmac.HMAC(self._salt or bytes(32), hashes.SHA256())
+        extract.update(self._token)
+        expand = hmac.HMAC(extract.finalize(), hashes.SHA256())
 
-        return hkdf.derive(self._token)
+        keys: Dict[bytes, bytes] = {}
+        for info in CryptoInfo:
+            block = expand.copy()
+            block.update(info.value + b"\x01")
+            keys[info.value] = block.finalize()
+
+        return keys
+
+    def _cipher(self, info: bytes) -> AESGCM:
+        return self._ciphers[info]
 
     def encrypt_data(self, data: str, info: bytes) -> bytes:
-        key = self.get_aes_master_key(info)
-        aes = AESGCM(key)
-        nonce = os.urandom(12)
+        aes = self._cipher(info)
+        nonce = self._nonces.next12()
         ct = aes.encrypt(nonce, data.encode(), None)
 
         return nonce + ct
 
     def decrypt_data(self, data_bytes: bytes, info: bytes) -> str:
-        key = self.get_aes_master_key(info)
-        aes = AESGCM(key)
+        aes = self._cipher(info)
         nonce = data_bytes[:12]
         ct = data_bytes[12:]
 
         return aes.decrypt(nonce, ct, None).decode()
 
+    def hash_data(self, data: str, info: bytes) -> bytes:
+        # Keyed BLAKE2b for values that are only ever compared, never read back
+        return hashlib.blake2b(
+            data.encode(), key=self._keys[info], digest_size=32
+        ).digest()
+
+    def encrypt_many(
+        self, items: Sequence[Tuple[Optional[str], bytes]]
+    ) -> List[Optional[bytes]]:
+        # Missing values pass through as None so optional fields keep their slot
+        return [
+            self.encrypt_data(data, info) if data is not None else None
+            for data, info in items
+        ]
+
+    def decrypt_many(self, items: Sequence[Tuple[bytes, bytes]]) -> List[str]:
+        return [self.decrypt_data(data_bytes, info) for data_bytes, info in items]
+
+    async def encrypt_data_async(self, data: str, info: bytes) -> bytes:
+        return await run_in_threadpool(self.encrypt_data, data, info)
+
+    async def decrypt_data_async(self, data_bytes: bytes, info: bytes) -> str:
+        return await run_in_threadpool(self.decrypt_data, data_bytes, info)
+
+    async def encrypt_many_async(
+        self, items: Sequence[Tuple[Optional[str], bytes]]
+    ) -> List[Optional[bytes]]:
+        return await run_in_threadpool(self.encrypt_many, items)
+
+    async def decrypt_many_async(
+        self, items: Sequence[Tuple[bytes, bytes]]
+    ) -> List[str]:
+        return await run_in_threadpool(self.decrypt_many, items)
+
 
 crypto = Crypto(
     settings.AES_TOKEN.get_secret_value(),
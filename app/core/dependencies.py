@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Any, Awaitable, Callable, Dict
 
 from fastapi import Depends
@@ -12,10 +13,10 @@ from app.services.auth import authorize_user, authorize_user_db, validate_refres
 bearer_scheme = HTTPBearer(auto_error=True)
 
 
-def require_authorization(
+async def require_authorization(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ) -> AuthorizedUser:
-    return authorize_user(credentials)
+    return await authorize_user(credentials)
 
 
 async def require_authorization_db(
@@ -25,23 +26,25 @@ async def require_authorization_db(
     return await authorize_user_db(credentials, db)
 
 
-def require_refresh_token(
+async def require_refresh_token(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ) -> Dict[str, Any]:
-    return validate_refresh_token(credentials)
+    return await validate_refresh_token(credentials)
 
 
+@lru_cache(maxsize=None)
 def require_role(
     role: UserRole,
-) -> Callable[[HTTPAuthorizationCredentials], AuthorizedUser]:
-    def dependency(
+) -> Callable[[HTTPAuthorizationCredentials], Awaitable[AuthorizedUser]]:
+    async def dependency(
         credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     ) -> AuthorizedUser:
-        return authorize_user(credentials, role)
+        return await authorize_user(credentials, role)
 
     return dependency
 
 
+@lru_cache(maxsize=None)
 def require_role_db(
     role: UserRole,
 ) -> Callable[
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntFlag
 
 
 class TokenType(str, Enum):
@@ -61,6 +61,15 @@ class MessageType(str, Enum):
     SERVICE = "service"
 
 
+class MessageFlag(IntFlag):
+    IS_TOPIC_MESSAGE = 1
+    IS_AUTOMATIC_FORWARD = 2
+    HAS_MEDIA_SPOILER = 4
+    HAS_PROTECTED_CONTENT = 8
+    IS_FROM_OFFLINE = 16
+    IS_PAID_POST = 32
+
+
 class FileType(str, Enum):
     CHAT_PHOTO = "chat_photo"
     PHOTO = "photo"
@@ -0,0 +1,11 @@
+import httpx
+from telegram.request import HTTPXRequest
+
+# Shared across requests so connections to Telegram and redirect targets are
+# kept alive, closed in the app lifespan
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100)
+)
+
+# One pool for every telegram.Bot instead of a client per bot object
+telegram_request = HTTPXRequest(connection_pool_size=100)
@@ -1,4 +1,59 @@
+from typing import Any, Callable, Set, TypeVar
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address, headers_enabled=True)
+from app.core.settings import settings
+
+# Point RATE_LIMIT_STORAGE_URI at redis:// to share counters between workers,
+# the sliding window counter is applied there by a single Lua script per hit
+limiter = Limiter(
+    key_func=get_remote_address,
+    headers_enabled=True,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY,
+)
+
+# In-process limits for cheap per-IP endpoints, skipping the shared storage RTT
+local_limiter = Limiter(
+    key_func=get_remote_address,
+    headers_enabled=True,
+    storage_uri="memory://",
+    strategy=settings.RATE_LIMIT_STRATEGY,
+)
+
+# Endpoints limited by local_limiter, so 429 headers are read from its storage
+_local_endpoints: Set[str] = set()
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _endpoint_name(func: Callable[..., Any]) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def local_limit(limit_value: str) -> Callable[[F], F]:
+    decorator = local_limiter.limit(limit_value)
+
+    def register(func: F) -> F:
+        _local_endpoints.add(_endpoint_name(func))
+        limited: F = decorator(func)
+        return limited
+
+    return register
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
+    # Headers have to be read from the limiter whose storage holds the counter
+    endpoint = request.scope.get("endpoint")
+    is_local = endpoint is not None and _endpoint_name(endpoint) in _local_endpoints
+    source = local_limiter if is_local else limiter
+
+    response = JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.detail}"}, status_code=429
+    )
+
+    return source._inject_headers(response, request.state.view_rate_limit)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import HttpUrl, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -10,6 +10,14 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: str
     DATABASE_URL: SecretStr
     DATABASE_ECHO: bool = False
+    DATABASE_POOL_SIZE: int = 20
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = 1800
+
+    RATE_LIMIT_STORAGE_URI: str = "memory://"
+    RATE_LIMIT_STRATEGY: Literal[
+        "fixed-window", "moving-window", "sliding-window-counter"
+    ] = "sliding-window-counter"
 
     API_URL: HttpUrl
     JWT_SECRET: SecretStr
@@ -18,6 +26,7 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRES_DAYS: int = 30
     JWT_ISSUER: Optional[str] = None
     JWT_AUDIENCE: Optional[str] = None
+    PASSWORD_HASH_WORKERS: Optional[int] = None
 
     AES_TOKEN: SecretStr
     AES_TOKEN_SALT: Optional[SecretStr] = None
@@ -26,6 +35,8 @@ class Settings(BaseSettings):
     MAX_USER_BOTS: int = 10
     MAX_USER_BOT_LINKS: int = 30
 
+    CHATS_COUNT_CACHE_MIN: int = 1000
+
     OTP_LENGTH: int = 6
     OTP_TTL: int = 60
 
@@ -36,6 +47,7 @@ class Settings(BaseSettings):
     TELEGRAM_API_FILE_URL: HttpUrl = HttpUrl("https://api.telegram.org/file/bot")
 
     WEBHOOK_REDIRECT_TIMEOUT: float = 10.0
+    WEBHOOK_MAX_INFLIGHT: int = 100
     TELEGRAM_API_REDIRECT_TIMEOUT: float = 10.0
 
     ATTACH_FRONTEND: bool = False
@@ -0,0 +1,23 @@
+import os
+from starlette.responses import Response
+from starlette.staticfiles import PathLike, StaticFiles
+from starlette.types import Scope
+
+# Next.js build assets have content hashes in their names, so they never change
+IMMUTABLE_PREFIX = os.path.join("_next", "static") + os.sep
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class FrontendStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if status_code == 200 and self.get_path(scope).startswith(IMMUTABLE_PREFIX):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+
+        return response
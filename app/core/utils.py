@@ -1,9 +1,24 @@
 import asyncio
 import secrets
-from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type, TypeVar
+from functools import lru_cache
+from operator import attrgetter
+from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 from fastapi import HTTPException, Request
-from sqlalchemy import delete, select
+from sqlalchemy import ColumnElement, CursorResult, delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from user_agents import parse  # type: ignore[import-untyped]
 
@@ -12,26 +27,39 @@ from app.core.settings import settings
 from app.core.logger import logger
 from app.db.models.otp_code import OtpCode
 from app.db.models.user import User
+from app.db.functions import now_minus
 from app.db.session import async_session
 from app.db.models.session import Session
 from app.schemas.auth import AuthorizedUser
 
 
+async def delete_in_batches(
+    model: Union[Type[Session], Type[OtpCode]],
+    condition: ColumnElement[bool],
+    batch_size: int = 10000,
+) -> int:
+    deleted = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size)
+        async with async_session() as db:
+            async with db.begin():
+                result = await db.execute(delete(model).where(model.id.in_(ids)))
+
+        count = cast(CursorResult[Any], result).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
 async def cleanup_old_data() -> None:
     logger.info("Cleanup old database data")
 
-    cutoff_sessions = datetime.now(timezone.utc) - timedelta(
-        days=settings.REFRESH_TOKEN_EXPIRES_DAYS
-    )
-    cutoff_otp = datetime.now(timezone.utc) - timedelta(minutes=settings.OTP_TTL)
+    cutoff_sessions = now_minus(timedelta(days=settings.REFRESH_TOKEN_EXPIRES_DAYS))
+    cutoff_otp = now_minus(timedelta(minutes=settings.OTP_TTL))
 
     try:
-        async with async_session() as db:
-            async with db.begin():
-                await db.execute(
-                    delete(Session).where(Session.updated_at < cutoff_sessions)
-                )
-                await db.execute(delete(OtpCode).where(OtpCode.created_at < cutoff_otp))
+        await delete_in_batches(Session, Session.updated_at < cutoff_sessions)
+        await delete_in_batches(OtpCode, OtpCode.created_at < cutoff_otp)
     except Exception as e:
         logger.error(e)
 
@@ -42,21 +70,38 @@ async def periodic_cleanup(interval_seconds: int = 3600) -> None:
         await asyncio.sleep(interval_seconds)
 
 
-def get_session_name_from_user_agent(request: Request) -> str:
-    user_agent_str = request.headers.get("user-agent", "")
+@lru_cache(maxsize=4096)
+def _parse_user_agent(user_agent_str: str) -> str:
     user_agent = parse(user_agent_str)
 
     return str(user_agent).replace(" / ", ", ")
 
 
-def generate_numeric_otp(n_digits: int) -> str:
+def get_session_name_from_user_agent(request: Request) -> str:
+    return _parse_user_agent(request.headers.get("user-agent", ""))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+@lru_cache(maxsize=8)
+def _otp_format(n_digits: int) -> Tuple[int, str]:
     if n_digits <= 0:
         raise ValueError("n_digits must be positive")
 
-    upper = 10**n_digits
-    code = secrets.randbelow(upper)
+    return 10**n_digits, f"{{:0{n_digits}d}}"
 
-    return f"{code:0{n_digits}d}"
+
+def generate_numeric_otp(n_digits: int) -> str:
+    upper, fmt = _otp_format(n_digits)
+
+    return fmt.format(secrets.randbelow(upper))
 
 
 async def update_user_bool_field(
@@ -67,110 +112,152 @@ async def update_user_bool_field(
     value: bool,
     error_msg: str,
 ) -> User:
-    q = await db.execute(select(User).where(User.id == user_id))
-    user = q.scalar_one_or_none()
+    field = getattr(User, field_name)
+    q = await db.execute(select(User.role, field).where(User.id == user_id))
+    row = q.one_or_none()
 
-    if not user:
+    if not row:
         raise HTTPException(status_code=404, detail="User not found")
 
+    role, current_value = row
     if (
-        user.role == UserRole.ADMIN or user.role == UserRole.GOD
+        role == UserRole.ADMIN or role == UserRole.GOD
     ) and authorized_user.role != UserRole.GOD:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    current_value = getattr(user, field_name)
     if current_value == value:
         raise HTTPException(status_code=409, detail=error_msg)
 
-    setattr(user, field_name, value)
+    user: Optional[User] = await db.scalar(
+        update(User)
+        .where(User.id == user_id)
+        .values({field_name: value})
+        .returning(User)
+    )
     await db.commit()
 
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
     return user
 
 
 FindType = TypeVar("FindType")
 
 
-def find_instances(
-    obj: object, target_type: Type[FindType], seen: Optional[Set[int]] = None
-) -> List[FindType]:
-    if seen is None:
-        seen = set()
+_public_slots_cache: Dict[type, Tuple[str, ...]] = {}
 
-    obj_id = id(obj)
-    if obj_id in seen:
-        return []
 
-    seen.add(obj_id)
-    found: List[FindType] = []
+def _public_slots(cls: type) -> Tuple[str, ...]:
+    cached = _public_slots_cache.get(cls)
+    if cached is not None:
+        return cached
 
-    # If the object itself is the type we want
-    if isinstance(obj, target_type):
-        found.append(obj)
+    names: Dict[str, None] = {}
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
 
-    # Explore attributes
-    if isinstance(obj, dict):
-        for value in obj.values():
-            found.extend(find_instances(value, target_type, seen))
+        for name in slots:
+            if not name.startswith("_"):
+                names[name] = None
 
-    elif isinstance(obj, (list, tuple, set)):
-        for item in obj:
-            found.extend(find_instances(item, target_type, seen))
+    result = tuple(names)
+    _public_slots_cache[cls] = result
 
-    else:
-        # Inspect object attributes (ignore private/internal)
-        for attr in dir(obj):
-            if attr.startswith("_"):
-                continue
+    return result
 
-            try:
-                value = getattr(obj, attr)
-            except Exception:
-                continue
 
-            found.extend(find_instances(value, target_type, seen))
+def _iter_children(obj: object) -> List[object]:
+    if isinstance(obj, dict):
+        return list(obj.values())
+
+    if isinstance(obj, (list, tuple, set)):
+        return list(obj)
+
+    # Only instance attributes are inspected, so properties and lazy loaders
+    # are never triggered
+    children = [
+        value
+        for attr, value in getattr(obj, "__dict__", {}).items()
+        if not attr.startswith("_")
+    ]
+    for attr in _public_slots(type(obj)):
+        try:
+            children.append(getattr(obj, attr))
+        except AttributeError:
+            continue
 
-    return found
+    return children
 
 
-def find_objects_with_attributes(
-    obj: object, required_attrs: Iterable[str], seen: Optional[Set[int]] = None
-) -> List[object]:
+def walk_objects(
+    obj: object,
+    visitors: Iterable[Callable[[object], None]],
+    seen: Optional[Set[int]] = None,
+) -> None:
     if seen is None:
         seen = set()
 
-    obj_id = id(obj)
-    if obj_id in seen:
-        return []
+    visitors = tuple(visitors)
+    stack = [obj]
 
-    seen.add(obj_id)
-    results: List[object] = []
+    while stack:
+        current = stack.pop()
+        current_id = id(current)
+        if current_id in seen:
+            continue
 
-    if all(hasattr(obj, attr) for attr in required_attrs):
-        results.append(obj)
+        seen.add(current_id)
+
+        for visit in visitors:
+            visit(current)
+
+        stack.extend(reversed(_iter_children(current)))
 
-    if isinstance(obj, dict):
-        for v in obj.values():
-            results.extend(find_objects_with_attributes(v, required_attrs, seen))
 
-    elif isinstance(obj, (list, tuple, set)):
-        for item in obj:
-            results.extend(find_objects_with_attributes(item, required_attrs, seen))
+def instances_collector(
+    target_type: Type[FindType],
+) -> Tuple[List[FindType], Callable[[object], None]]:
+    found: List[FindType] = []
+
+    def visit(obj: object) -> None:
+        if isinstance(obj, target_type):
+            found.append(obj)
+
+    return found, visit
 
-    else:
-        # Inspect object attributes (ignore private/internal)
-        for attr in dir(obj):
-            if attr.startswith("_"):
-                continue
 
-            try:
-                value = getattr(obj, attr)
-            except Exception:
-                continue
+def attributes_collector(
+    required_attrs: Iterable[str],
+) -> Tuple[List[object], Callable[[object], None]]:
+    attrs = tuple(required_attrs)
+    found: List[object] = []
 
-            results.extend(find_objects_with_attributes(value, required_attrs, seen))
+    def visit(obj: object) -> None:
+        if all(hasattr(obj, attr) for attr in attrs):
+            found.append(obj)
 
-    return results
+    return found, visit
+
+
+def find_instances(
+    obj: object, target_type: Type[FindType], seen: Optional[Set[int]] = None
+) -> List[FindType]:
+    found, visit = instances_collector(target_type)
+    walk_objects(obj, (visit,), seen)
+
+    return found
+
+
+def find_objects_with_attributes(
+    obj: object, required_attrs: Iterable[str], seen: Optional[Set[int]] = None
+) -> List[object]:
+    found, visit = attributes_collector(required_attrs)
+    walk_objects(obj, (visit,), seen)
+
+    return found
 
 
 DeduplicateType = TypeVar("DeduplicateType")
@@ -179,16 +266,10 @@ DeduplicateType = TypeVar("DeduplicateType")
 def deduplicate(
     objects: List[DeduplicateType], field_name: str
 ) -> Dict[Any, DeduplicateType]:
+    get_key = attrgetter(field_name)
     unique: Dict[Any, DeduplicateType] = {}
     for obj in objects:
-        try:
-            key = getattr(obj, field_name)
-        except AttributeError:
-            # Skip objects that lack any of the fields
-            continue
-
-        if key not in unique:
-            unique[key] = obj
+        unique.setdefault(get_key(obj), obj)
 
     return unique
 
@@ -196,16 +277,12 @@ def deduplicate(
 def deduplicate_compound(
     objects: List[DeduplicateType], field_names: Iterable[str]
 ) -> Dict[Tuple[Any, ...], DeduplicateType]:
+    fields = tuple(field_names)
+    get_key = attrgetter(*fields)
     unique: Dict[Tuple[Any, ...], DeduplicateType] = {}
     for obj in objects:
-        try:
-            key = tuple(getattr(obj, f) for f in field_names)
-        except AttributeError:
-            # Skip objects that lack any of the fields
-            continue
-
-        if key not in unique:
-            unique[key] = obj
+        key = get_key(obj)
+        unique.setdefault(key if len(fields) > 1 else (key,), obj)
 
     return unique
 
@@ -216,25 +293,22 @@ def remove_fields(
     exclude_nested: Optional[Iterable[str]] = None,
 ) -> Dict[str, Any]:
     if exclude:
-        for item in exclude:
-            if item in data:
-                del data[item]
+        excluded = frozenset(exclude)
+        data = {k: v for k, v in data.items() if k not in excluded}
 
     if not exclude_nested:
         return data
 
+    excluded_nested = frozenset(exclude_nested)
+
     def recurse(value: Any) -> Any:
         if isinstance(value, dict):
-            for key in list(value.keys()):
-                if key in exclude_nested:
-                    del value[key]
-                else:
-                    value[key] = recurse(value[key])
+            return {k: recurse(v) for k, v in value.items() if k not in excluded_nested}
         elif isinstance(value, list):
             return [recurse(v) for v in value]
 
         return value
 
-    data = recurse(data)
+    result: Dict[str, Any] = recurse(data)
 
-    return data
+    return result
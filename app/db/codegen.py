@@ -0,0 +1,81 @@
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ToDictSpec = Sequence[Tuple[str, str, str]]
+
+_EXPRESSIONS = {
+    "raw": "{value}",
+    "enum": "_enum_values[{value}]",
+    "timestamp": "{value}.timestamp()",
+    "timestamp_opt": "{value}.timestamp() if {value} is not None else None",
+    "flag": "bool({value} & {arg})",
+    "chat_stub": '{{"id": {value}, "type": ""}}',
+    "user_stub": (
+        '{{"id": {value}, "first_name": "", "is_bot": False}} if {value} else None'
+    ),
+    "bot_stub": (
+        '{{"id": {value}, "first_name": "", "is_bot": True}} if {value} else None'
+    ),
+}
+
+
+class _EnumValues(Dict[Enum, Any]):
+    # A dict lookup is several times cheaper than the Enum.value descriptor
+    def __missing__(self, member: Enum) -> Any:
+        value = self[member] = member.value
+        return value
+
+
+_enum_values = _EnumValues()
+
+# Kinds that read their attribute more than once get it bound to a local first
+_HOISTED_KINDS = frozenset({"timestamp_opt", "user_stub", "bot_stub", "flag"})
+
+
+def build_to_dict(
+    spec: ToDictSpec, merge_attr: Optional[str] = None
+) -> Callable[..., Dict[str, Any]]:
+    lines = ["def to_dict(self, merge=True):" if merge_attr else "def to_dict(self):"]
+    items: List[str] = []
+    hoisted: Dict[str, str] = {}
+    for key, attr, kind_spec in spec:
+        # Parametrized kinds are written as "kind:arg", e.g. "flag:4"
+        kind, _, arg = kind_spec.partition(":")
+        if kind not in _EXPRESSIONS:
+            raise ValueError(f"Unknown to_dict field kind: {kind}")
+
+        if not attr.isidentifier():
+            raise ValueError(f"Invalid attribute name: {attr}")
+
+        if kind == "flag" and not arg.isdigit():
+            raise ValueError(f"Invalid flag mask: {arg}")
+
+        value = f"self.{attr}"
+        if kind in _HOISTED_KINDS:
+            if attr not in hoisted:
+                hoisted[attr] = f"v{len(hoisted)}"
+                lines.append(f"    {hoisted[attr]} = {value}")
+
+            value = hoisted[attr]
+
+        expression = _EXPRESSIONS[kind].format(value=value, arg=arg)
+        items.append(f"        {key!r}: ({expression}),")
+
+    lines.append("    data = {")
+    lines.extend(items)
+    lines.append("    }")
+
+    if merge_attr:
+        if not merge_attr.isidentifier():
+            raise ValueError(f"Invalid attribute name: {merge_attr}")
+
+        lines.append(f"    if merge and self.{merge_attr}:")
+        lines.append(f"        data.update(self.{merge_attr})")
+
+    lines.append("    return data")
+
+    namespace: Dict[str, Any] = {}
+    exec("\n".join(lines), {"_enum_values": _enum_values}, namespace)
+    to_dict: Callable[..., Dict[str, Any]] = namespace["to_dict"]
+
+    return to_dict
@@ -0,0 +1,39 @@
+from typing import Any, Iterable, Union
+from sqlalchemy import Insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.session import engine
+
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+if engine.dialect.name not in SUPPORTED_DIALECTS:
+    raise RuntimeError(
+        f"Unsupported database dialect {engine.dialect.name!r}, "
+        f"expected one of: {', '.join(SUPPORTED_DIALECTS)}"
+    )
+
+
+def dialect_insert(model: Any) -> Union[postgresql.Insert, sqlite.Insert]:
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+
+    return sqlite.insert(model)
+
+
+def insert_ignore_conflicts(model: Any, index_elements: Iterable[str]) -> Insert:
+    return dialect_insert(model).on_conflict_do_nothing(
+        index_elements=list(index_elements)
+    )
+
+
+def upsert(
+    model: Any,
+    index_elements: Iterable[str],
+    update_columns: Iterable[str],
+    **extra_values: Any,
+) -> Insert:
+    stmt = dialect_insert(model)
+    values = {column: stmt.excluded[column] for column in update_columns}
+    values.update(extra_values)
+
+    return stmt.on_conflict_do_update(index_elements=list(index_elements), set_=values)
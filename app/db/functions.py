@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import DateTime, Interval, String, bindparam
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class now_minus(FunctionElement[datetime]):
+    type = DateTime(timezone=True)
+    name = "now_minus"
+    inherit_cache = True
+
+    def __init__(self, delta: timedelta) -> None:
+        seconds = int(delta.total_seconds())
+        super().__init__(
+            bindparam(None, delta, type_=Interval()),
+            bindparam(None, f"-{seconds} seconds", type_=String()),
+        )
+
+
+@compiles(now_minus)
+def _compile_now_minus(element: now_minus, compiler: SQLCompiler, **kw: Any) -> str:
+    interval = list(element.clauses)[0]
+    return f"CURRENT_TIMESTAMP - {compiler.process(interval, **kw)}"
+
+
+@compiles(now_minus, "sqlite")
+def _compile_now_minus_sqlite(
+    element: now_minus, compiler: SQLCompiler, **kw: Any
+) -> str:
+    modifier = list(element.clauses)[1]
+    return f"datetime('now', {compiler.process(modifier, **kw)})"
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
-from sqlalchemy import DateTime, Enum, ForeignKey, UniqueConstraint, func
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.enums import OtpCodeType
 from app.db.base import Base
@@ -11,7 +11,15 @@ if TYPE_CHECKING:
 
 class OtpCode(Base):
     __tablename__ = "otp_codes"
-    __table_args__ = (UniqueConstraint("user_id", "type", name="uq_otp_user_type"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "type", name="uq_otp_user_type"),
+        Index(
+            "ix_otp_type_code",
+            "type",
+            "code",
+            postgresql_include=["user_id", "created_at"],
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(
@@ -23,7 +31,7 @@ class OtpCode(Base):
         nullable=False,
     )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
     )
 
     user: Mapped["User"] = relationship(back_populates="otp_codes")
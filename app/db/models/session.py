@@ -1,5 +1,5 @@
 from typing import TYPE_CHECKING, Optional
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 from app.db.mixins import TimestampMixin
@@ -10,6 +10,7 @@ if TYPE_CHECKING:
 
 class Session(Base, TimestampMixin):
     __tablename__ = "sessions"
+    __table_args__ = (Index("ix_sessions_updated_at", "updated_at"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(
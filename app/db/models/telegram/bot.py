@@ -29,17 +29,17 @@ class Bot(Base, TimestampMixin):
     has_main_web_app: Mapped[bool] = mapped_column(nullable=False)
 
     users: Mapped[List["UserBot"]] = relationship(
-        back_populates="bot", passive_deletes=True
+        back_populates="bot", passive_deletes="all"
     )
     webhook: Mapped[Optional["BotWebhook"]] = relationship(
-        back_populates="bot", uselist=False, passive_deletes=True
+        back_populates="bot", uselist=False, passive_deletes="all"
     )
     telegram_user: Mapped["TelegramUser"] = relationship(
         back_populates="bot", uselist=False, passive_deletes=True
     )
     messages: Mapped[List["BotMessage"]] = relationship(
-        back_populates="bot", passive_deletes=True
+        back_populates="bot", passive_deletes="all"
     )
     files: Mapped[List["BotFile"]] = relationship(
-        back_populates="bot", passive_deletes=True
+        back_populates="bot", passive_deletes="all"
     )
@@ -17,7 +17,7 @@ class BotWebhook(Base, TimestampMixin):
         primary_key=True,
     )
 
-    secret_token: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    secret_token_hash: Mapped[bytes] = mapped_column(LargeBinary(32), nullable=False)
 
     redirect_url: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
     redirect_token: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
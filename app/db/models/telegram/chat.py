@@ -93,7 +93,7 @@ class TelegramChat(Base, TimestampMixin):
     other_data: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=True)
 
     read_messages: Mapped[List["ReadMessages"]] = relationship(
-        back_populates="chat", passive_deletes=True
+        back_populates="chat", passive_deletes="all"
     )
 
     def to_dict(self) -> Dict[str, Any]:
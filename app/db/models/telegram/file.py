@@ -30,7 +30,7 @@ class TelegramFile(Base):
     )
 
     bots: Mapped[List["BotFile"]] = relationship(
-        back_populates="file", passive_deletes=True
+        back_populates="file", passive_deletes="all"
     )
 
     def to_dict(self) -> Dict[str, Any]:
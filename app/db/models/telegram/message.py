@@ -1,16 +1,22 @@
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type
 from sqlalchemy import (
     JSON,
     BigInteger,
+    ColumnElement,
     DateTime,
-    Enum,
     ForeignKey,
     Index,
+    SmallInteger,
 )
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from app.core.enums import MessageType
+from app.core.constants import MESSAGE_FLAG_FIELDS
+from app.core.enums import MessageFlag, MessageType
 from app.db.base import Base
+from app.db.codegen import build_to_dict
+from app.db.types import SmallIntEnum
 
 if TYPE_CHECKING:
     from app.db.models.telegram.bot_message import BotMessage
@@ -18,9 +24,26 @@ if TYPE_CHECKING:
     from app.db.models.telegram.user import TelegramUser
 
 
+def flag_property(flag: MessageFlag) -> "hybrid_property[bool]":
+    def getter(self: "TelegramMessage") -> bool:
+        return bool((self.flags or 0) & flag)
+
+    def setter(self: "TelegramMessage", value: bool) -> None:
+        flags = self.flags or 0
+        self.flags = int(flags | flag if value else flags & ~flag)
+
+    def expression(cls: Type["TelegramMessage"]) -> ColumnElement[bool]:
+        return cls.flags.op("&")(flag) != 0
+
+    return hybrid_property(getter, setter, expr=expression)
+
+
 class TelegramMessage(Base):
     __tablename__ = "telegram_messages"
-    __table_args__ = (Index("ix_chat_id_message_type", "chat_id", "message_type"),)
+    __table_args__ = (
+        Index("ix_chat_id_message_type", "chat_id", "message_type"),
+        Index("ix_msg_chat_thread_id", "chat_id", "message_thread_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     chat_id: Mapped[int] = mapped_column(
@@ -33,13 +56,10 @@ class TelegramMessage(Base):
     chat: Mapped["TelegramChat"] = relationship(foreign_keys=[chat_id], uselist=False)
 
     message_type: Mapped[MessageType] = mapped_column(
-        Enum(MessageType, name="message_type"), nullable=False
+        SmallIntEnum(MessageType), nullable=False
     )
 
-    message_thread_id: Mapped[int] = mapped_column(
-        nullable=True,
-        index=True,
-    )
+    message_thread_id: Mapped[int] = mapped_column(nullable=True)
 
     text: Mapped[str] = mapped_column(nullable=True)
     caption: Mapped[str] = mapped_column(nullable=True)
@@ -83,61 +103,49 @@ class TelegramMessage(Base):
 
     business_connection_id: Mapped[Optional[str]] = mapped_column(nullable=True)
 
-    is_topic_message: Mapped[bool] = mapped_column(default=False, nullable=False)
-    is_automatic_forward: Mapped[bool] = mapped_column(default=False, nullable=False)
+    flags: Mapped[int] = mapped_column(SmallInteger, default=0, nullable=False)
 
-    has_media_spoiler: Mapped[bool] = mapped_column(default=False, nullable=False)
-    has_protected_content: Mapped[bool] = mapped_column(default=False, nullable=False)
-    is_from_offline: Mapped[bool] = mapped_column(default=False, nullable=False)
-    is_paid_post: Mapped[bool] = mapped_column(default=False, nullable=False)
+    is_topic_message = flag_property(MessageFlag.IS_TOPIC_MESSAGE)
+    is_automatic_forward = flag_property(MessageFlag.IS_AUTOMATIC_FORWARD)
+    has_media_spoiler = flag_property(MessageFlag.HAS_MEDIA_SPOILER)
+    has_protected_content = flag_property(MessageFlag.HAS_PROTECTED_CONTENT)
+    is_from_offline = flag_property(MessageFlag.IS_FROM_OFFLINE)
+    is_paid_post = flag_property(MessageFlag.IS_PAID_POST)
 
     author_signature: Mapped[Optional[str]] = mapped_column(nullable=True)
     paid_star_count: Mapped[Optional[int]] = mapped_column(nullable=True)
 
-    other_data: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=True)
+    other_data: Mapped[Dict[str, Any]] = mapped_column(
+        JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"),
+        nullable=True,
+        deferred=True,
+    )
 
     bots: Mapped[List["BotMessage"]] = relationship(
-        back_populates="message", passive_deletes=True
+        back_populates="message", passive_deletes="all"
     )
 
-    def to_dict(self) -> Dict[str, Any]:
-        data = {
-            "message_id": self.id,
-            "chat": {"id": self.chat_id, "type": ""},
-            "message_thread_id": self.message_thread_id,
-            "message_type": self.message_type.value,
-            "text": self.text,
-            "caption": self.caption,
-            "from": (
-                {"id": self.from_user_id, "first_name": "", "is_bot": False}
-                if self.from_user_id
-                else None
+    to_dict = build_to_dict(
+        (
+            ("message_id", "id", "raw"),
+            ("chat", "chat_id", "chat_stub"),
+            ("message_thread_id", "message_thread_id", "raw"),
+            ("message_type", "message_type", "enum"),
+            ("text", "text", "raw"),
+            ("caption", "caption", "raw"),
+            ("from", "from_user_id", "user_stub"),
+            ("sender_chat", "sender_chat_id", "user_stub"),
+            ("sender_boost_count", "sender_boost_count", "raw"),
+            ("sender_business_bot", "sender_business_bot_id", "bot_stub"),
+            ("date", "date", "timestamp"),
+            ("edit_date", "edit_date", "timestamp_opt"),
+            ("business_connection_id", "business_connection_id", "raw"),
+            *(
+                (field, "flags", f"flag:{flag.value}")
+                for field, flag in MESSAGE_FLAG_FIELDS
             ),
-            "sender_chat": (
-                {"id": self.sender_chat_id, "first_name": "", "is_bot": False}
-                if self.sender_chat_id
-                else None
-            ),
-            "sender_boost_count": self.sender_boost_count,
-            "sender_business_bot": (
-                {"id": self.sender_business_bot_id, "first_name": "", "is_bot": True}
-                if self.sender_business_bot_id
-                else None
-            ),
-            "date": self.date.timestamp(),
-            "edit_date": self.edit_date.timestamp() if self.edit_date else None,
-            "business_connection_id": self.business_connection_id,
-            "is_topic_message": self.is_topic_message,
-            "is_automatic_forward": self.is_automatic_forward,
-            "has_media_spoiler": self.has_media_spoiler,
-            "has_protected_content": self.has_protected_content,
-            "is_from_offline": self.is_from_offline,
-            "is_paid_post": self.is_paid_post,
-            "author_signature": self.author_signature,
-            "paid_star_count": self.paid_star_count,
-        }
-
-        if self.other_data:
-            data.update(self.other_data)
-
-        return data
+            ("author_signature", "author_signature", "raw"),
+            ("paid_star_count", "paid_star_count", "raw"),
+        ),
+        merge_attr="other_data",
+    )
@@ -23,7 +23,7 @@ class ReadMessages(Base, TimestampMixin):
     )
 
     message_thread_id: Mapped[int] = mapped_column(
-        BigInteger, default=1, nullable=False
+        BigInteger, primary_key=True, default=1, nullable=False
     )
     message_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
@@ -1,7 +1,8 @@
-from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from typing import TYPE_CHECKING, List, Optional
 from sqlalchemy import BigInteger, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
+from app.db.codegen import build_to_dict
 from app.db.mixins import TimestampMixin
 from app.db.models.telegram.message import TelegramMessage
 
@@ -29,13 +30,17 @@ class TelegramUser(Base, TimestampMixin):
         foreign_keys=[TelegramMessage.from_user_id], back_populates="from_user"
     )
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "id": self.id,
-            "is_bot": self.is_bot,
-            "is_premium": self.is_premium,
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "username": self.username,
-            "language_code": self.language_code,
-        }
+    to_dict = build_to_dict(
+        tuple(
+            (name, name, "raw")
+            for name in (
+                "id",
+                "is_bot",
+                "is_premium",
+                "first_name",
+                "last_name",
+                "username",
+                "language_code",
+            )
+        )
+    )
@@ -1,8 +1,8 @@
 from typing import TYPE_CHECKING, List
-from sqlalchemy import Enum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.enums import UserRole
 from app.db.base import Base
+from app.db.types import SmallIntEnum
 from app.db.mixins import TimestampMixin
 from app.db.models.telegram.read_messages import ReadMessages
 
@@ -23,18 +23,18 @@ class User(Base, TimestampMixin):
     password_hash: Mapped[str] = mapped_column(nullable=False)
     email_verified: Mapped[bool] = mapped_column(default=False, nullable=False)
     role: Mapped[UserRole] = mapped_column(
-        Enum(UserRole, name="user_role"), nullable=False, default=UserRole.USER
+        SmallIntEnum(UserRole), nullable=False, default=UserRole.USER
     )
 
     sessions: Mapped[List["Session"]] = relationship(
-        back_populates="user", passive_deletes=True
+        back_populates="user", passive_deletes="all"
     )
     bots: Mapped[List["UserBot"]] = relationship(
-        back_populates="user", passive_deletes=True
+        back_populates="user", passive_deletes="all"
     )
     otp_codes: Mapped[List["OtpCode"]] = relationship(
-        back_populates="user", passive_deletes=True
+        back_populates="user", passive_deletes="all"
     )
     read_messages: Mapped[List["ReadMessages"]] = relationship(
-        back_populates="user", passive_deletes=True
+        back_populates="user", passive_deletes="all"
     )
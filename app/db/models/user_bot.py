@@ -1,8 +1,9 @@
 from typing import TYPE_CHECKING
-from sqlalchemy import BigInteger, Enum, ForeignKey
+from sqlalchemy import BigInteger, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.enums import UserBotRole
 from app.db.base import Base
+from app.db.types import SmallIntEnum
 from app.db.mixins import TimestampMixin
 
 if TYPE_CHECKING:
@@ -13,15 +14,20 @@ if TYPE_CHECKING:
 class UserBot(Base, TimestampMixin):
     __tablename__ = "user_bots"
 
+    # The (user_id, bot_id) primary key covers lookups by user, bot_id gets its
+    # own index for per-bot member queries
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
     )
     bot_id: Mapped[int] = mapped_column(
-        BigInteger, ForeignKey("bots.id", ondelete="CASCADE"), primary_key=True
+        BigInteger,
+        ForeignKey("bots.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
     )
 
     role: Mapped[UserBotRole] = mapped_column(
-        Enum(UserBotRole, name="user_bot_role"),
+        SmallIntEnum(UserBotRole),
         nullable=False,
     )
 
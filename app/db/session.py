@@ -1,5 +1,5 @@
-from typing import AsyncGenerator
-from sqlalchemy import text
+from typing import Any, AsyncGenerator, Dict
+from sqlalchemy import event, make_url
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncSession,
@@ -8,19 +8,43 @@ from sqlalchemy.ext.asyncio import (
 from app.core.settings import settings
 
 
-engine = create_async_engine(
-    settings.DATABASE_URL.get_secret_value(), echo=settings.DATABASE_ECHO
-)
+database_url = make_url(settings.DATABASE_URL.get_secret_value())
+backend = database_url.get_backend_name()
+is_sqlite = backend == "sqlite"
+
+engine_options: Dict[str, Any] = {
+    "echo": settings.DATABASE_ECHO,
+    "pool_pre_ping": True,
+    "insertmanyvalues_page_size": 1000,
+}
+if not is_sqlite:
+    engine_options["pool_size"] = settings.DATABASE_POOL_SIZE
+    engine_options["max_overflow"] = settings.DATABASE_MAX_OVERFLOW
+    engine_options["pool_recycle"] = settings.DATABASE_POOL_RECYCLE
+    engine_options["pool_use_lifo"] = True
+
+if backend in ("postgres", "postgresql"):
+    database_url = database_url.set(drivername="postgresql+asyncpg")
+    if "prepared_statement_cache_size" not in database_url.query:
+        database_url = database_url.update_query_dict(
+            {"prepared_statement_cache_size": "512"}
+        )
+
+    engine_options["connect_args"] = {"statement_cache_size": 1024}
+
+engine = create_async_engine(database_url, **engine_options)
 async_session = async_sessionmaker(
     bind=engine, expire_on_commit=False, class_=AsyncSession
 )
 
 
-async def setup_db() -> None:
-    if settings.DATABASE_URL.get_secret_value().startswith("sqlite"):
-        async with async_session() as db:
-            async with db.begin():
-                await db.execute(text("PRAGMA foreign_keys=ON"))
+if is_sqlite:
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def enable_sqlite_foreign_keys(dbapi_connection: Any, _: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -0,0 +1,38 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional, Type, TypeVar
+from sqlalchemy import Dialect, SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+EnumType = TypeVar("EnumType", bound=Enum)
+
+
+# Members are stored by definition index: only append new members to the enum,
+# never reorder or remove existing ones
+class SmallIntEnum(TypeDecorator[EnumType]):
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class: Type[EnumType]) -> None:
+        super().__init__()
+        self.enum_class = enum_class
+        self._members: List[EnumType] = list(enum_class)
+        self._indexes: Dict[EnumType, int] = {
+            member: i for i, member in enumerate(self._members)
+        }
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> Optional[int]:
+        if value is None:
+            return None
+
+        if not isinstance(value, self.enum_class):
+            value = self.enum_class(value)
+
+        return self._indexes[value]
+
+    def process_result_value(
+        self, value: Optional[int], dialect: Dialect
+    ) -> Optional[EnumType]:
+        if value is None:
+            return None
+
+        return self._members[value]
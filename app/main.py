@@ -3,38 +3,41 @@ from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi_pagination import add_pagination
-from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
-from app.core.limiter import limiter
+from app.core.crypto import check_crypto_backend
+from app.core.http_client import http_client, telegram_request
+from app.core.limiter import limiter, rate_limit_exceeded_handler
 from app.core.logger import logger
-from app.db.session import setup_db
 from app.routes import api
 from app.core.settings import settings
+from app.core.static import FrontendStaticFiles
 from app.core.utils import periodic_cleanup
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    await setup_db()
-    cleanup_task = asyncio.create_task(periodic_cleanup())
+    check_crypto_backend()
 
-    logger.info("App started successfully")
+    async with asyncio.TaskGroup() as tg:
+        cleanup_task = tg.create_task(periodic_cleanup(), name="cleanup")
 
-    yield
+        logger.info("App started successfully")
 
-    cleanup_task.cancel()
-    try:
-        await cleanup_task
-    except asyncio.CancelledError:
-        pass
+        yield
+
+        cleanup_task.cancel()
+
+    await http_client.aclose()
+    await telegram_request.shutdown()
 
     logger.info("App shutdown")
 
 
-origins = settings.ALLOWED_ORIGINS.split(",") if settings.ALLOWED_ORIGINS else []
+origins = [
+    origin.strip() for origin in settings.ALLOWED_ORIGINS.split(",") if origin.strip()
+]
 
 app = FastAPI(
     lifespan=lifespan,
@@ -60,8 +63,8 @@ app.add_middleware(
 
 add_pagination(app)
 
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)  # type: ignore[arg-type]
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)  # type: ignore[arg-type]
 app.include_router(api.router)
 
 if settings.ATTACH_FRONTEND:
-    app.mount("/", StaticFiles(directory=settings.FRONTEND_PATH, html=True))
+    app.mount("/", FrontendStaticFiles(directory=settings.FRONTEND_PATH, html=True))
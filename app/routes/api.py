@@ -14,19 +14,23 @@ from app.core.limiter import limiter
 
 router = APIRouter(prefix=settings.API_PREFIX)
 
+INFO_PAYLOAD: Dict[str, str] = {
+    "title": settings.APP_TITLE,
+    "version": settings.APP_VERSION,
+    "docs_url": urljoin(str(settings.API_URL), "/docs"),
+}
+HEALTH_OK = DetailResponse(detail="ok")
+HEALTH_DB_UNAVAILABLE = DetailResponse(detail="database unavailable")
+
 
 @router.get("/", response_model=Dict[str, str], tags=["root"])
 @limiter.limit("10/minute")
-def info(request: Request, response: Response) -> Dict[str, str]:
-    return {
-        "title": settings.APP_TITLE,
-        "version": settings.APP_VERSION,
-        "docs_url": urljoin(str(settings.API_URL), "/docs"),
-    }
+async def info(request: Request, response: Response) -> Dict[str, str]:
+    return INFO_PAYLOAD
 
 
 @router.get("/health", response_model=DetailResponse, tags=["root"])
-@limiter.limit("10/minute")
+@limiter.exempt  # type: ignore[untyped-decorator]
 async def health_check(
     request: Request,
     response: Response,
@@ -34,10 +38,10 @@ async def health_check(
 ) -> DetailResponse:
     try:
         await db.execute(text("SELECT 1"))
-        return DetailResponse(detail="ok")
+        return HEALTH_OK
     except Exception:
         response.status_code = 503
-        return DetailResponse(detail="database unavailable")
+        return HEALTH_DB_UNAVAILABLE
 
 
 router.include_router(auth.router)
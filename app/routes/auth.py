@@ -1,10 +1,17 @@
-from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List
-
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from sqlalchemy import exists, func, select
+from datetime import timedelta
+from typing import Any, Dict
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+)
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload, selectinload
 
 from app.core.dependencies import (
     require_authorization,
@@ -16,6 +23,7 @@ from app.core.settings import settings
 from app.db.models.otp_code import OtpCode
 from app.db.models.session import Session
 from app.db.models.user import User
+from app.db.functions import now_minus
 from app.db.session import get_db
 from app.schemas.auth import (
     AuthorizedUser,
@@ -34,24 +42,43 @@ from app.schemas.auth import (
 from app.schemas.common_responses import DetailResponse
 from app.schemas.user import UserResponse
 from app.services.auth import (
+    dummy_verify_password,
     hash_password,
+    invalidate_user_cache,
     issue_otp,
     logout_current_session,
     issue_token_pair,
     revoke_all_sessions,
-    revoke_session_by_jti,
     rotate_refresh_token,
     send_verification_email,
+    verify_and_update_password,
     verify_password,
 )
 from app.services.email import send_email
-from app.core.limiter import limiter
+from app.core.limiter import limiter, local_limit
 from app.core.utils import get_session_name_from_user_agent
 from app.services.bloom_filter import bloom_filter
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+SESSIONS_BY_USER = select(
+    Session.id,
+    Session.name,
+    Session.created_at,
+    Session.updated_at,
+    Session.access_jti,
+).where(Session.user_id == bindparam("user_id"))
+SESSION_BY_ID = select(
+    Session.id,
+    Session.name,
+    Session.created_at,
+    Session.updated_at,
+    Session.access_jti,
+).where(Session.id == bindparam("session_id"), Session.user_id == bindparam("user_id"))
+
 
 @router.post(
     "/register",
@@ -62,40 +89,48 @@ router = APIRouter(prefix="/auth", tags=["auth"])
             "content": {"application/json": {"example": {"detail": "Bad request"}}},
         },
         409: {
-            "description": "Email already registered",
+            "description": "Email or username already registered",
             "content": {
-                "application/json": {"example": {"detail": "Email already registered"}}
+                "application/json": {
+                    "example": {"detail": "Email or username already registered"}
+                }
             },
         },
     },
 )
-@limiter.limit("5/minute")
+@local_limit("5/minute")
 async def register(
     request: Request,
     response: Response,
     body: RegisterRequest,
     db: AsyncSession = Depends(get_db),
 ) -> TokensResponse:
-    email_exists = await db.execute(select(exists().where(User.email == body.email)))
-    if email_exists.scalar():
-        raise HTTPException(status_code=409, detail="Email already registered")
-
-    user = User(
-        email=body.email,
-        username=body.username,
-        password_hash=hash_password(body.password),
-        email_verified=False,
-    )
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
+    password_hash = await hash_password(body.password)
+    try:
+        q = await db.execute(
+            insert(User)
+            .values(
+                email=body.email,
+                username=body.username,
+                password_hash=password_hash,
+                email_verified=False,
+            )
+            .returning(User)
+        )
+        user = q.scalar_one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=409, detail="Email or username already registered"
+        )
 
     session_name = get_session_name_from_user_agent(request)
     access, refresh, expires_in, refresh_expires_in = await issue_token_pair(
         db, user, session_name
     )
 
-    return TokensResponse(
+    return TokensResponse.model_construct(
         access_token=access,
         refresh_token=refresh,
         expires_in=expires_in,
@@ -119,25 +154,34 @@ async def register(
         },
     },
 )
-@limiter.limit("5/minute")
+@local_limit("5/minute")
 async def login(
     request: Request,
     response: Response,
     body: LoginRequest,
     db: AsyncSession = Depends(get_db),
 ) -> TokensResponse:
-    field = User.email if body.email else User.username
-    value = body.email or body.username
+    if body.email:
+        q = await db.execute(USER_BY_EMAIL, {"email": body.email})
+    else:
+        q = await db.execute(USER_BY_USERNAME, {"username": body.username})
 
-    q = await db.execute(select(User).where(field == value))
     user = q.scalar_one_or_none()
-    if (
-        not user
-        or not user.password_hash
-        or not verify_password(body.password, user.password_hash)
-    ):
+    if not user or not user.password_hash:
+        # Spend the same hashing time as a real check to hide which users exist
+        await dummy_verify_password()
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    verified, new_password_hash = await verify_and_update_password(
+        body.password, user.password_hash
+    )
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Rehash legacy bcrypt hashes, saved by the commit in issue_token_pair
+    if new_password_hash:
+        user.password_hash = new_password_hash
+
     if user.is_banned:
         raise HTTPException(status_code=403, detail="User is banned")
 
@@ -146,7 +190,7 @@ async def login(
         db, user, session_name
     )
 
-    return TokensResponse(
+    return TokensResponse.model_construct(
         access_token=access,
         refresh_token=refresh,
         expires_in=expires_in,
@@ -212,28 +256,28 @@ async def logout_all(
         },
     },
 )
-@limiter.limit("5/minute")
+@local_limit("5/minute")
 async def list_sessions(
     request: Request,
     response: Response,
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> SessionListResponse:
-    q = await db.execute(select(Session).where(Session.user_id == current_user.id))
-    sessions = q.scalars().all()
-    result: List[SessionInfo] = []
-    for s in sessions:
-        result.append(
-            SessionInfo(
-                id=s.id,
-                name=s.name,
-                created_at=s.created_at,
-                updated_at=s.updated_at,
-                is_current=s.access_jti == current_user.jti,
-            )
+    q = await db.execute(SESSIONS_BY_USER, {"user_id": current_user.id})
+    result = [
+        SessionInfo.model_construct(
+            id=s.id,
+            name=s.name,
+            created_at=s.created_at,
+            updated_at=s.updated_at,
+            is_current=s.access_jti == current_user.jti,
         )
+        for s in q
+    ]
 
-    return SessionListResponse(sessions=result, limit=settings.MAX_USER_SESSIONS)
+    return SessionListResponse.model_construct(
+        sessions=result, limit=settings.MAX_USER_SESSIONS
+    )
 
 
 @router.get(
@@ -254,7 +298,7 @@ async def list_sessions(
         },
     },
 )
-@limiter.limit("5/minute")
+@local_limit("5/minute")
 async def get_session(
     session_id: int,
     request: Request,
@@ -263,15 +307,13 @@ async def get_session(
     db: AsyncSession = Depends(get_db),
 ) -> SessionInfo:
     q = await db.execute(
-        select(Session).where(
-            Session.id == session_id, Session.user_id == current_user.id
-        )
+        SESSION_BY_ID, {"session_id": session_id, "user_id": current_user.id}
     )
-    s = q.scalar_one_or_none()
+    s = q.one_or_none()
     if s is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    return SessionInfo(
+    return SessionInfo.model_construct(
         id=s.id,
         name=s.name,
         created_at=s.created_at,
@@ -306,17 +348,16 @@ async def revoke_session(
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> Response:
-    q = await db.execute(
-        select(Session).where(
-            Session.id == session_id, Session.user_id == current_user.id
-        )
+    access_jti = await db.scalar(
+        delete(Session)
+        .where(Session.id == session_id, Session.user_id == current_user.id)
+        .returning(Session.access_jti)
     )
-    s = q.scalar_one_or_none()
-    if s is None:
+    if access_jti is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    await revoke_session_by_jti(db, s.refresh_jti)
-    bloom_filter.add(s.access_jti)
+    await db.commit()
+    bloom_filter.add(access_jti)
 
     return Response(status_code=204)
 
@@ -333,7 +374,7 @@ async def revoke_session(
         },
     },
 )
-@limiter.limit("5/minute")
+@local_limit("5/minute")
 async def refresh(
     request: Request,
     response: Response,
@@ -345,7 +386,7 @@ async def refresh(
         db, int(refresh_payload["sub"]), refresh_payload["jti"], session_name
     )
 
-    return TokensResponse(
+    return TokensResponse.model_construct(
         access_token=access,
         refresh_token=refresh,
         expires_in=expires_in,
@@ -369,7 +410,7 @@ async def refresh(
         },
     },
 )
-@limiter.limit("10/minute")
+@local_limit("10/minute")
 async def me(
     request: Request,
     response: Response,
@@ -406,6 +447,7 @@ async def me(
 async def email_send_confirmation(
     request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     current_user: AuthorizedUserDb = Depends(require_authorization_db),
     db: AsyncSession = Depends(get_db),
 ) -> DetailResponse:
@@ -415,7 +457,7 @@ async def email_send_confirmation(
     if current_user.user.email_verified:
         raise HTTPException(status_code=409, detail="Email already verified")
 
-    await send_verification_email(db, current_user.user)
+    await send_verification_email(db, current_user.user, background_tasks)
 
     return DetailResponse(detail="Verification email sent")
 
@@ -441,26 +483,24 @@ async def verify_email(
     body: EmailVerifyRequest,
     db: AsyncSession = Depends(get_db),
 ) -> DetailResponse:
-    q = await db.execute(
-        select(OtpCode)
-        .options(joinedload(OtpCode.user))
+    user_id = await db.scalar(
+        delete(OtpCode)
         .where(
             OtpCode.user_id == body.user_id,
             OtpCode.type == OtpCodeType.VERIFY_EMAIL,
             OtpCode.code == body.otp,
-            OtpCode.created_at > func.now() - timedelta(minutes=settings.OTP_TTL),
+            OtpCode.created_at > now_minus(timedelta(minutes=settings.OTP_TTL)),
         )
+        .returning(OtpCode.user_id)
     )
-    otp_code = q.scalar_one_or_none()
-    if not otp_code:
+    if user_id is None:
         raise HTTPException(
             status_code=404, detail="OTP code invalid or user not found"
         )
 
-    await db.delete(otp_code)
-    otp_code.user.email_verified = True
-
+    await db.execute(update(User).where(User.id == user_id).values(email_verified=True))
     await db.commit()
+    invalidate_user_cache(user_id)
 
     return DetailResponse(detail="Email verified")
 
@@ -492,12 +532,19 @@ async def verify_email(
                 "application/json": {"example": {"detail": "Not authenticated"}}
             },
         },
+        409: {
+            "description": "Email already registered",
+            "content": {
+                "application/json": {"example": {"detail": "Email already registered"}}
+            },
+        },
     },
 )
 @limiter.limit("5/minute")
 async def email_change(
     request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     body: EmailChangeRequest,
     current_user: AuthorizedUserDb = Depends(require_authorization_db),
     db: AsyncSession = Depends(get_db),
@@ -511,11 +558,23 @@ async def email_change(
             status_code=400, detail="New email must differ from current"
         )
 
-    current_user.user.email = new_email
-    current_user.user.email_verified = False
+    user = current_user.user
+    try:
+        await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(email=new_email, email_verified=False)
+        )
+        await revoke_all_sessions(db, user.id, commit=False)
+        otp = await issue_otp(db, user.id, OtpCodeType.VERIFY_EMAIL, commit=False)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Email already registered")
 
-    await revoke_all_sessions(db, current_user.user.id)
-    await send_verification_email(db, current_user.user)
+    background_tasks.add_task(
+        send_email, new_email, "Verify your email", "confirm", user.username, otp
+    )
 
     return DetailResponse(detail="Email updated. Verification sent")
 
@@ -528,17 +587,20 @@ async def email_change(
 async def password_forgot(
     request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     body: PasswordForgotRequest,
     db: AsyncSession = Depends(get_db),
 ) -> DetailResponse:
-    q = await db.execute(select(User).where(User.email == body.email))
+    q = await db.execute(USER_BY_EMAIL, {"email": body.email})
     user = q.scalar_one_or_none()
     if not user:
         return DetailResponse(detail="If the email exists, a reset link has been sent")
 
     otp = await issue_otp(db, user.id, OtpCodeType.PASSWORD_RESET)
 
-    await send_email(user.email, "Password reset", "reset", user.username, otp)
+    background_tasks.add_task(
+        send_email, user.email, "Password reset", "reset", user.username, otp
+    )
 
     return DetailResponse(detail="If the email exists, a reset link has been sent")
 
@@ -590,29 +652,31 @@ async def password_reset(
     db: AsyncSession = Depends(get_db),
 ) -> DetailResponse:
     q = await db.execute(
-        select(OtpCode)
-        .options(selectinload(OtpCode.user))
+        select(OtpCode.id, OtpCode.user_id, User.password_hash)
         .join(OtpCode.user)
         .where(
             OtpCode.type == OtpCodeType.PASSWORD_RESET,
             OtpCode.code == body.otp,
-            OtpCode.created_at
-            > datetime.now(timezone.utc) - timedelta(minutes=settings.OTP_TTL),
+            OtpCode.created_at > now_minus(timedelta(minutes=settings.OTP_TTL)),
             User.email == body.email,
         )
     )
-    otp_code = q.scalar_one_or_none()
-    if not otp_code:
+    row = q.one_or_none()
+    if not row:
         raise HTTPException(
             status_code=404, detail="OTP code invalid or user not found"
         )
 
-    if verify_password(body.new_password, otp_code.user.password_hash):
+    otp_id, user_id, password_hash = row
+    if await verify_password(body.new_password, password_hash):
         raise HTTPException(status_code=409, detail="New password is the same as old")
 
-    otp_code.user.password_hash = hash_password(body.new_password)
-    await db.delete(otp_code)
-    await revoke_all_sessions(db, otp_code.user.id)
+    new_password_hash = await hash_password(body.new_password)
+    await db.execute(delete(OtpCode).where(OtpCode.id == otp_id))
+    await db.execute(
+        update(User).where(User.id == user_id).values(password_hash=new_password_hash)
+    )
+    await revoke_all_sessions(db, user_id)
 
     return DetailResponse(detail="Password reset")
 
@@ -638,18 +702,18 @@ async def password_change(
     body: PasswordChangeRequest,
     db: AsyncSession = Depends(get_db),
 ) -> DetailResponse:
-    q = await db.execute(select(User).where(User.email == body.email))
+    q = await db.execute(USER_BY_EMAIL, {"email": body.email})
     user = q.scalar_one_or_none()
     if (
         not user
         or not user.password_hash
-        or not verify_password(body.old_password, user.password_hash)
+        or not await verify_password(body.old_password, user.password_hash)
     ):
         raise HTTPException(
             status_code=401, detail="Invalid old password or user not found"
         )
 
-    user.password_hash = hash_password(body.new_password)
+    user.password_hash = await hash_password(body.new_password)
     await revoke_all_sessions(db, user.id)
 
     return DetailResponse(detail="Password updated")
@@ -1,11 +1,12 @@
-import json
+import asyncio
 import secrets
 from urllib.parse import urljoin
 from typing import Dict, Any, Union, List, Optional
 
-import httpx
+import orjson
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
     HTTPException,
     Header,
@@ -13,23 +14,30 @@ from fastapi import (
     Request,
     Response,
 )
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import bindparam, case, func, literal, or_, select, update
+from sqlalchemy.orm import joinedload, raiseload
 from sqlalchemy.ext.asyncio import AsyncSession
 from telegram import Message, Update
 from telegram.error import TelegramError
 
+from app.core.constants import (
+    BOT_TOKEN_INFO,
+    WEBHOOK_REDIRECT_TOKEN_INFO,
+    WEBHOOK_TOKEN_INFO,
+    WEBHOOK_URL_INFO,
+)
 from app.core.crypto import crypto
 from app.core.settings import settings
 from app.core.limiter import limiter
 from app.core.logger import logger
+from app.db.dml import upsert
 from app.db.models.telegram.bot import Bot
 from app.db.models.telegram.bot_webhook import BotWebhook
 from app.db.models.telegram.user import TelegramUser
 from app.db.models.user import User
 from app.db.models.user_bot import UserBot
 from app.db.session import get_db
-from app.core.enums import CryptoInfo, UserBotRole, UserRole
+from app.core.enums import UserBotRole, UserRole
 from app.schemas.common_responses import DetailResponse
 from app.schemas.telegram.bot import (
     BotListResponse,
@@ -43,19 +51,33 @@ from app.schemas.telegram.bot import (
 from app.core.dependencies import require_authorization
 from app.schemas.auth import AuthorizedUser
 from app.services.telegram.bots import (
+    BOT_RESPONSE_COLUMNS,
+    forward_update,
     get_bot_users_count,
     get_user_bot,
     get_user_bots_count,
     get_userbot_mapping,
+    get_userbot_role,
     get_telegram_bot,
     make_bot_response,
     remove_extra_bot_links,
+    require_bot_owner,
 )
 from app.services.telegram.entity_logger import log_object, update_message
 from app.services.telegram.logger import proxy_file_request, proxy_request
 
 router = APIRouter(prefix="/bots", tags=["telegram-bots"])
 
+TELEGRAM_USER_WITH_BOT = (
+    select(TelegramUser)
+    .options(joinedload(TelegramUser.bot))
+    .where(TelegramUser.id == bindparam("telegram_user_id"))
+)
+WEBHOOK_BY_TOKEN = select(BotWebhook.redirect_url, BotWebhook.redirect_token).where(
+    BotWebhook.bot_id == bindparam("bot_id"),
+    BotWebhook.secret_token_hash == bindparam("token_hash"),
+)
+
 common_responses: Dict[Union[int, str], Dict[str, Any]] = {
     409: {
         "description": "User is already in relationship with bot",
@@ -129,25 +151,28 @@ async def create_or_transfer_bot(
 ) -> BotResponse:
     telegram_bot = get_telegram_bot(body.token)
 
+    # The caller's bot count doesn't depend on Telegram, so it runs under get_me
+    me_task = asyncio.create_task(telegram_bot.get_me())
+    try:
+        user_bots_count = await get_user_bots_count(db, current_user.id)
+    except BaseException:
+        me_task.cancel()
+        raise
+
     try:
-        me = await telegram_bot.get_me()
+        me = await me_task
     except TelegramError as e:
         logger.error(e)
         raise HTTPException(status_code=400, detail="Telegram API error")
 
     token_stripped = body.token.split(":", 1)[1]
-    token_encrypted = crypto.encrypt_data(token_stripped, CryptoInfo.BOT_TOKEN)
+    token_encrypted = await crypto.encrypt_data_async(token_stripped, BOT_TOKEN_INFO)
     bot_username: str = me.username  # type: ignore
 
-    q = await db.execute(
-        select(TelegramUser)
-        .options(selectinload(TelegramUser.bot))
-        .where(TelegramUser.id == me.id)
-    )
+    q = await db.execute(TELEGRAM_USER_WITH_BOT, {"telegram_user_id": me.id})
     existing_user: Optional[TelegramUser] = q.scalar_one_or_none()
 
     if existing_user is None:
-        user_bots_count = await get_user_bots_count(db, current_user.id)
         if user_bots_count >= settings.MAX_USER_BOTS:
             raise HTTPException(
                 status_code=403,
@@ -197,23 +222,34 @@ async def create_or_transfer_bot(
             role=UserBotRole.OWNER,
         )
 
-    q2 = await db.execute(select(UserBot).where(UserBot.bot_id == me.id))
-    userbot_rows = q2.scalars().all()
-
     my_link_exist = False
 
-    for ub in userbot_rows:
-        if ub.user_id == current_user.id:
-            ub.role = UserBotRole.OWNER
-            my_link_exist = True
-            continue
-
-        if ub.role == UserBotRole.OWNER:
-            ub.role = UserBotRole.VIEWER
+    # Links can only exist for a stored bot. The caller becomes the owner and
+    # any other owner is demoted in one statement, without loading the links
+    if existing_user.bot:
+        links = await db.execute(
+            update(UserBot)
+            .where(
+                UserBot.bot_id == me.id,
+                or_(
+                    UserBot.user_id == current_user.id,
+                    UserBot.role == UserBotRole.OWNER,
+                ),
+            )
+            .values(
+                role=case(
+                    (
+                        UserBot.user_id == current_user.id,
+                        literal(UserBotRole.OWNER, UserBot.role.type),
+                    ),
+                    else_=literal(UserBotRole.VIEWER, UserBot.role.type),
+                )
+            )
+            .returning(UserBot.user_id)
+        )
+        my_link_exist = current_user.id in links.scalars().all()
 
     if not my_link_exist:
-        user_bots_count = await get_user_bots_count(db, current_user.id)
-
         if user_bots_count >= settings.MAX_USER_BOTS:
             raise HTTPException(
                 status_code=403,
@@ -283,47 +319,16 @@ async def list_bots(
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> BotListResponse:
-    bots: List[BotResponse] = []
+    stmt = select(*BOT_RESPONSE_COLUMNS, UserBot.role).join(Bot.telegram_user)
     if current_user.role not in (UserRole.ADMIN, UserRole.GOD):
-        q = await db.execute(
-            select(UserBot)
-            .options(selectinload(UserBot.bot).selectinload(Bot.telegram_user))
-            .where(UserBot.user_id == current_user.id),
-        )
-
-        result = q.scalars().all()
-
-        for link in result:
-            bots.append(make_bot_response(link.bot, link.role))
-
-        return BotListResponse(
-            bots=bots,
-            limit=settings.MAX_USER_BOTS,
-        )
-
-    q = await db.execute(
-        select(Bot, UserBot.role)
-        .outerjoin(
+        stmt = stmt.join(Bot.users).where(UserBot.user_id == current_user.id)
+    else:
+        stmt = stmt.outerjoin(
             UserBot, (UserBot.bot_id == Bot.id) & (UserBot.user_id == current_user.id)
         )
-        .options(joinedload(Bot.telegram_user))
-    )
 
-    for bot, role in q.all():
-        bots.append(
-            BotResponse(
-                id=bot.id,
-                first_name=bot.telegram_user.first_name,
-                last_name=bot.telegram_user.last_name,
-                username=bot.telegram_user.username,
-                can_join_groups=bot.can_join_groups,
-                can_read_all_group_messages=bot.can_read_all_group_messages,
-                supports_inline_queries=bot.supports_inline_queries,
-                can_connect_to_business=bot.can_connect_to_business,
-                has_main_web_app=bot.has_main_web_app,
-                role=role,
-            )
-        )
+    q = await db.execute(stmt)
+    bots = [BotResponse.model_validate(row, from_attributes=True) for row in q]
 
     return BotListResponse(
         bots=bots,
@@ -401,31 +406,16 @@ async def get_bot_users(
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> BotUsersResponse:
-    stmt = (
-        select(Bot)
-        .options(selectinload(Bot.users).selectinload(UserBot.user))
-        .where(Bot.id == bot_id)
-    )
-    bot = (await db.execute(stmt)).scalar_one_or_none()
+    await require_bot_owner(db, bot_id, current_user)
 
-    if not bot:
-        if current_user.role in (UserRole.ADMIN, UserRole.GOD):
-            raise HTTPException(status_code=404, detail="Bot not found")
-
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    if current_user.role not in (UserRole.ADMIN, UserRole.GOD):
-        user_role = None
-        for bot_user in bot.users:
-            if bot_user.user_id == current_user.id:
-                user_role = bot_user.role
-                break
-
-        if user_role != UserBotRole.OWNER:
-            raise HTTPException(status_code=403, detail="Forbidden")
+    q = await db.execute(
+        select(UserBot)
+        .options(joinedload(UserBot.user), raiseload("*"))
+        .where(UserBot.bot_id == bot_id)
+    )
 
     users: List[BotUserResponse] = []
-    for bot_user in bot.users:
+    for bot_user in q.scalars():
         user = bot_user.user
         users.append(
             BotUserResponse(
@@ -453,28 +443,27 @@ async def get_bot_user(
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> BotUserResponse:
-    stmt = (
-        select(Bot)
-        .options(selectinload(Bot.users).selectinload(UserBot.user))
-        .where(Bot.id == bot_id)
-    )
-    bot = (await db.execute(stmt)).scalar_one_or_none()
-
-    if not bot:
-        if current_user.role in (UserRole.ADMIN, UserRole.GOD):
-            raise HTTPException(status_code=404, detail="Bot not found")
+    is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
+    user_ids = {user_id} if is_admin else {user_id, current_user.id}
 
-        raise HTTPException(status_code=403, detail="Forbidden")
+    # The caller's own link comes with the target one, keyed by user id
+    q = await db.execute(
+        select(UserBot)
+        .options(joinedload(UserBot.user), raiseload("*"))
+        .where(UserBot.bot_id == bot_id, UserBot.user_id.in_(user_ids))
+    )
+    mappings = {ub.user_id: ub for ub in q.scalars()}
 
-    if current_user.role not in (UserRole.ADMIN, UserRole.GOD):
-        current_user_mapping = next(
-            (ub for ub in bot.users if ub.user_id == current_user.id), None
-        )
-        if not current_user_mapping or current_user_mapping.role != UserBotRole.OWNER:
+    if not is_admin:
+        own_mapping = mappings.get(current_user.id)
+        if own_mapping is None or own_mapping.role != UserBotRole.OWNER:
             raise HTTPException(status_code=403, detail="Forbidden")
 
-    target_mapping = next((ub for ub in bot.users if ub.user_id == user_id), None)
+    target_mapping = mappings.get(user_id)
     if not target_mapping:
+        if is_admin:
+            await require_bot_owner(db, bot_id, current_user)
+
         raise HTTPException(status_code=404, detail="User not found")
 
     u = target_mapping.user
@@ -501,25 +490,7 @@ async def add_bot_user(
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> BotUserResponse:
-    stmt = (
-        select(Bot)
-        .options(selectinload(Bot.users).selectinload(UserBot.user))
-        .where(Bot.id == bot_id)
-    )
-    bot = (await db.execute(stmt)).scalar_one_or_none()
-
-    if not bot:
-        if current_user.role in (UserRole.ADMIN, UserRole.GOD):
-            raise HTTPException(status_code=404, detail="Bot not found")
-
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    is_owner = any(
-        ub.user_id == current_user.id and ub.role == UserBotRole.OWNER
-        for ub in bot.users
-    )
-    if current_user.role not in (UserRole.ADMIN, UserRole.GOD) and not is_owner:
-        raise HTTPException(status_code=403, detail="Forbidden")
+    await require_bot_owner(db, bot_id, current_user)
 
     field = User.email if body.email else User.username
     value = body.email or body.username
@@ -565,16 +536,15 @@ async def add_bot_user(
         db.add(new_mapping)
 
     if body.role == UserBotRole.OWNER and existing_mapping:
-        q2 = await db.execute(
-            select(UserBot).where(
+        await db.execute(
+            update(UserBot)
+            .where(
                 UserBot.bot_id == bot_id,
                 UserBot.role == UserBotRole.OWNER,
                 UserBot.user_id != existing_mapping.user_id,
             )
+            .values(role=UserBotRole.VIEWER)
         )
-        owner_mapping = q2.scalar_one_or_none()
-        if owner_mapping:
-            owner_mapping.role = UserBotRole.VIEWER
 
     await db.commit()
 
@@ -626,8 +596,8 @@ async def delete_bot_user(
         UserRole.ADMIN,
         UserRole.GOD,
     ):
-        current_user_relation = await get_userbot_mapping(db, bot_id, current_user.id)
-        if not current_user_relation or current_user_relation.role != UserBotRole.OWNER:
+        current_user_role = await get_userbot_role(db, bot_id, current_user.id)
+        if current_user_role != UserBotRole.OWNER:
             raise HTTPException(status_code=403, detail="Forbidden")
 
     await db.delete(user_bot)
@@ -663,7 +633,7 @@ async def set_webhook(
     ):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    bot_token_stripped = crypto.decrypt_data(bot.token, CryptoInfo.BOT_TOKEN)
+    bot_token_stripped = await crypto.decrypt_data_async(bot.token, BOT_TOKEN_INFO)
     bot_token = f"{bot.id}:{bot_token_stripped}"
     telegram_bot = get_telegram_bot(bot_token)
 
@@ -684,33 +654,27 @@ async def set_webhook(
         logger.error(e)
         raise HTTPException(status_code=400, detail="Telegram API error")
 
-    secret_token_encrypted = crypto.encrypt_data(secret_token, CryptoInfo.WEBHOOK_TOKEN)
-    redirect_url_encrypted = (
-        crypto.encrypt_data(str(body.url), CryptoInfo.WEBHOOK_URL) if body.url else None
-    )
-    orig_token_encrypted = (
-        crypto.encrypt_data(body.secret_token, CryptoInfo.WEBHOOK_REDIRECT_TOKEN)
-        if body.secret_token
-        else None
+    secret_token_hash = crypto.hash_data(secret_token, WEBHOOK_TOKEN_INFO)
+    redirect_url_encrypted, orig_token_encrypted = await crypto.encrypt_many_async(
+        [
+            (str(body.url) if body.url else None, WEBHOOK_URL_INFO),
+            (body.secret_token, WEBHOOK_REDIRECT_TOKEN_INFO),
+        ]
     )
 
-    q = await db.execute(select(BotWebhook).where(BotWebhook.bot_id == bot.id))
-    existing_webhook: Optional[BotWebhook] = q.scalar_one_or_none()
-    if existing_webhook is None:
-        db.add(
-            BotWebhook(
-                bot_id=bot.id,
-                secret_token=secret_token_encrypted,
-                redirect_url=redirect_url_encrypted,
-                redirect_token=orig_token_encrypted,
-            )
+    await db.execute(
+        upsert(
+            BotWebhook,
+            ("bot_id",),
+            ("secret_token_hash", "redirect_url", "redirect_token"),
+            updated_at=func.now(),
+        ).values(
+            bot_id=bot.id,
+            secret_token_hash=secret_token_hash,
+            redirect_url=redirect_url_encrypted,
+            redirect_token=orig_token_encrypted,
         )
-    else:
-        existing_webhook.secret_token = secret_token_encrypted
-        existing_webhook.redirect_url = redirect_url_encrypted
-        existing_webhook.redirect_token = orig_token_encrypted
-        db.add(existing_webhook)
-
+    )
     await db.commit()
 
     return DetailResponse(detail="Webhook set successfully")
@@ -745,17 +709,17 @@ async def get_webhook_info(
     if bot.webhook is None:
         raise HTTPException(status_code=404, detail="Webhook not found")
 
-    token_decrypted = crypto.decrypt_data(bot.token, CryptoInfo.BOT_TOKEN)
+    encrypted = [(bot.token, BOT_TOKEN_INFO)]
+    if bot.webhook.redirect_url:
+        encrypted.append((bot.webhook.redirect_url, WEBHOOK_URL_INFO))
+
+    token_decrypted, *redirect_url = await crypto.decrypt_many_async(encrypted)
     token = f"{bot.id}:{token_decrypted}"
 
     telegram_bot = get_telegram_bot(token)
     info = await telegram_bot.get_webhook_info()
     info_dict = info.to_dict()
-    info_dict["url"] = (
-        crypto.decrypt_data(bot.webhook.redirect_url, CryptoInfo.WEBHOOK_URL)
-        if bot.webhook.redirect_url
-        else None
-    )
+    info_dict["url"] = redirect_url[0] if redirect_url else None
 
     if "ip_address" in info_dict:
         del info_dict["ip_address"]
@@ -793,7 +757,7 @@ async def delete_webhook(
     if bot.webhook is None:
         raise HTTPException(status_code=404, detail="Webhook not found")
 
-    token_decrypted = crypto.decrypt_data(bot.token, CryptoInfo.BOT_TOKEN)
+    token_decrypted = await crypto.decrypt_data_async(bot.token, BOT_TOKEN_INFO)
     token = f"{bot.id}:{token_decrypted}"
 
     telegram_bot = get_telegram_bot(token)
@@ -821,21 +785,28 @@ async def handle_update(
     bot_id: int,
     request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     x_telegram_token: str = Header(..., alias="X-Telegram-Bot-Api-Secret-Token"),
     db: AsyncSession = Depends(get_db),
 ) -> Response:
-    q = await db.execute(select(BotWebhook).where(BotWebhook.bot_id == bot_id))
-    webhook = q.scalar_one_or_none()
+    # The secret is stored as a keyed hash, so the lookup itself verifies it
+    token_hash = crypto.hash_data(x_telegram_token, WEBHOOK_TOKEN_INFO)
+    q = await db.execute(WEBHOOK_BY_TOKEN, {"bot_id": bot_id, "token_hash": token_hash})
+    webhook = q.one_or_none()
 
     if webhook is None:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    token = crypto.decrypt_data(webhook.secret_token, CryptoInfo.WEBHOOK_TOKEN)
-    if x_telegram_token != token:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    redirect: List[str] = []
+    if webhook.redirect_url:
+        encrypted = [(webhook.redirect_url, WEBHOOK_URL_INFO)]
+        if webhook.redirect_token:
+            encrypted.append((webhook.redirect_token, WEBHOOK_REDIRECT_TOKEN_INFO))
+
+        redirect = await crypto.decrypt_many_async(encrypted)
 
     body = await request.body()
-    body_dict = json.loads(body)
+    body_dict = orjson.loads(body)
 
     try:
         updated_message: Optional[Message] = None
@@ -847,37 +818,27 @@ async def handle_update(
         elif update.edited_business_message:
             updated_message = update.edited_business_message
 
-        await log_object(db, update, bot_id)
+        logged = await log_object(db, update, bot_id)
 
         if updated_message:
             await update_message(db, updated_message, bot_id, skip_log=True)
 
-        await db.commit()
+        # Updates that add nothing new (polls, repeated entities) skip the commit
+        if updated_message or any(logged):
+            await db.commit()
     except Exception as e:
         logger.error(e)
 
-    if webhook.redirect_url:
-        url = crypto.decrypt_data(webhook.redirect_url, CryptoInfo.WEBHOOK_URL)
+    if redirect:
+        url = redirect[0]
         headers = {
             "Content-Type": request.headers.get("Content-Type", "application/json")
         }
 
-        if webhook.redirect_token:
-            headers["X-Telegram-Bot-Api-Secret-Token"] = crypto.decrypt_data(
-                webhook.redirect_token, CryptoInfo.WEBHOOK_REDIRECT_TOKEN
-            )
+        if len(redirect) > 1:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = redirect[1]
 
-        try:
-            async with httpx.AsyncClient(
-                timeout=settings.WEBHOOK_REDIRECT_TIMEOUT
-            ) as client:
-                await client.post(
-                    url,
-                    content=body,
-                    headers=headers,
-                )
-        except Exception as e:
-            logger.error(e)
+        background_tasks.add_task(forward_update, url, body, headers)
 
     return Response(status_code=200)
 
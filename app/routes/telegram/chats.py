@@ -1,8 +1,9 @@
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Union
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Type, Union
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
-from sqlalchemy import delete, exists, insert, or_, select, and_, func, update
-from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy import Select, Subquery, delete, or_, select, and_, func, tuple_
+from sqlalchemy.orm import joinedload, aliased, selectinload, undefer
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination import Page, Params
 
@@ -10,6 +11,7 @@ from app.core.enums import ChatType, UserRole
 from app.core.limiter import limiter
 from app.core.logger import logger
 from app.core.dependencies import require_authorization
+from app.core.utils import etag_matches
 from app.db.models.telegram.bot_message import BotMessage
 from app.db.models.telegram.chat import TelegramChat
 from app.db.models.telegram.message import TelegramMessage
@@ -18,17 +20,30 @@ from app.db.models.user_bot import UserBot
 from app.db.session import get_db
 from app.schemas.auth import AuthorizedUser
 from app.schemas.telegram.chat import ReadRequest
-from app.services.telegram.bots import get_bot_by_chat, get_bot_by_id
+from app.services.telegram.bots import (
+    get_bot_by_chat,
+    get_bot_by_id,
+    stream_telegram_file,
+)
 from app.services.telegram.chats import (
+    bot_access_filter,
+    bulk_mark_read,
     check_bot_access,
+    cache_chats_count,
+    get_accessible_chats_count,
+    get_avatar_etag,
+    get_cached_chats_count,
     get_message_options,
     parse_bot_param,
     serialize_message,
+    set_avatar_etag,
 )
 from app.services.telegram.logger import log_chat_full_info
 
 router = APIRouter(prefix="/chats", tags=["telegram-chats"])
 
+AVATAR_MAX_AGE = 3600
+
 common_responses: Dict[Union[int, str], Dict[str, Any]] = {
     404: {
         "description": "Chat not found or no accessible messages",
@@ -69,47 +84,15 @@ def _parse_chat_types(chat_types: Optional[str]) -> List[ChatType]:
     return result
 
 
-@router.get(
-    "",
-    response_model=Page[Dict[str, Any]],
-    responses={
-        403: common_responses[403],
-        401: common_responses[401],
-        400: common_responses[400],
-    },
-)
-@limiter.limit("10/minute")
-async def list_accessible_chats(
-    request: Request,
-    response: Response,
-    bots: Optional[str] = Query(
-        None,
-        description="Comma-separated bot IDs. If provided, only chats where these bots have messages are included.",
-    ),
-    chat_types: Optional[str] = Query(
-        None,
-        description="Comma-separated chat types to filter: private,group,supergroup,channel",
-    ),
-    search: Optional[str] = Query(
-        None,
-        description="Search in chat title, username or name (case-insensitive)",
-    ),
-    current_user: AuthorizedUser = Depends(require_authorization),
-    db: AsyncSession = Depends(get_db),
-    params: Params = Depends(),
-) -> Page[Dict[str, Any]]:
-    is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
-
-    requested_bot_ids = await parse_bot_param(bots)
-    await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
-
-    valid_chat_types = _parse_chat_types(chat_types)
-    search_term = f"%{search}%" if search else None
-
+def _accessible_chats_subquery(
+    current_user_id: int,
+    is_admin: bool,
+    requested_bot_ids: Optional[Set[int]],
+    valid_chat_types: List[ChatType],
+    search_term: Optional[str],
+) -> Subquery:
     bm = BotMessage
     ub = UserBot
-    tc = TelegramChat
-    rm = ReadMessages
 
     # ── Build subquery for latest message per chat ──────────────────────────
     last_msg_sub_stmt = select(
@@ -119,10 +102,12 @@ async def list_accessible_chats(
 
     # User/bot access filter
     if requested_bot_ids:
-        last_msg_sub_stmt = last_msg_sub_stmt.where(bm.bot_id.in_(requested_bot_ids))
+        last_msg_sub_stmt = last_msg_sub_stmt.where(
+            bot_access_filter(current_user_id, requested_bot_ids, is_admin)
+        )
     elif not is_admin:
         last_msg_sub_stmt = last_msg_sub_stmt.join(ub, ub.bot_id == bm.bot_id).where(
-            ub.user_id == current_user.id
+            ub.user_id == current_user_id
         )
 
     # Chat type / search filter applied to the subquery so the count is accurate
@@ -144,49 +129,144 @@ async def list_accessible_chats(
                 )
             )
 
-    last_msg_sub_stmt = last_msg_sub_stmt.group_by(bm.chat_id)
-    last_msg_sub = last_msg_sub_stmt.subquery()
+    return last_msg_sub_stmt.group_by(bm.chat_id).subquery()
 
-    last_msg = aliased(TelegramMessage)
-
-    # Total count (honours all filters)
-    count_q = await db.execute(select(func.count()).select_from(last_msg_sub))
-    total = count_q.scalar_one()
 
-    offset = (params.page - 1) * params.size
-    limit = params.size
+def _accessible_chats_stmt(
+    last_msg_sub: Subquery,
+) -> Tuple[Select[TelegramChat, TelegramMessage], Type[TelegramMessage]]:
+    last_msg = aliased(TelegramMessage)
 
     stmt = (
-        select(tc, last_msg, rm.message_thread_id, rm.message_id)
-        .join(last_msg_sub, last_msg_sub.c.chat_id == tc.id)
-        .join(last_msg, last_msg.id == last_msg_sub.c.last_message_id)
-        .outerjoin(rm, and_(rm.chat_id == tc.id, rm.user_id == current_user.id))
+        select(TelegramChat, last_msg)
+        .join(last_msg_sub, last_msg_sub.c.chat_id == TelegramChat.id)
+        .join(
+            last_msg,
+            and_(
+                last_msg.chat_id == last_msg_sub.c.chat_id,
+                last_msg.id == last_msg_sub.c.last_message_id,
+            ),
+        )
         .options(
-            joinedload(last_msg.from_user),
-            joinedload(last_msg.sender_chat),
-            joinedload(last_msg.sender_business_bot),
+            selectinload(last_msg.from_user),
+            selectinload(last_msg.sender_chat),
+            selectinload(last_msg.sender_business_bot),
+            undefer(last_msg.other_data),
         )
-        .order_by(last_msg.date.desc())
-        .offset(offset)
-        .limit(limit)
     )
 
-    rows = (await db.execute(stmt)).all()
+    return stmt, last_msg
+
+
+async def _serialize_chat_rows(
+    db: AsyncSession, rows: Sequence[Any], current_user_id: int
+) -> List[Dict[str, Any]]:
+    rm = ReadMessages
 
+    # Read marks are fetched separately: a chat has one per thread, so joining
+    # them would multiply the paginated rows
     chat_read_map: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
-    for chat, _, thread_id, msg_id in rows:
-        if thread_id is not None:
-            chat_read_map[chat.id].append(
+    if rows:
+        read_rows = await db.execute(
+            select(rm.chat_id, rm.message_thread_id, rm.message_id).where(
+                rm.user_id == current_user_id,
+                rm.chat_id.in_({chat.id for chat, _ in rows}),
+            )
+        )
+        for read_chat_id, thread_id, msg_id in read_rows:
+            chat_read_map[read_chat_id].append(
                 {"message_thread_id": thread_id, "message_id": msg_id}
             )
 
     items: List[Dict[str, Any]] = []
-    for chat, message, *_ in rows:
+    for chat, message in rows:
         chat_dict = chat.to_dict()
         chat_dict["last_message"] = serialize_message(message)
         chat_dict["read_messages"] = chat_read_map.get(chat.id, [])
         items.append(chat_dict)
 
+    return items
+
+
+@router.get(
+    "",
+    response_model=Page[Dict[str, Any]],
+    responses={
+        403: common_responses[403],
+        401: common_responses[401],
+        400: common_responses[400],
+    },
+)
+@limiter.limit("10/minute")
+async def list_accessible_chats(
+    request: Request,
+    response: Response,
+    bots: Optional[str] = Query(
+        None,
+        description="Comma-separated bot IDs. If provided, only chats where these bots have messages are included.",
+    ),
+    chat_types: Optional[str] = Query(
+        None,
+        description="Comma-separated chat types to filter: private,group,supergroup,channel",
+    ),
+    search: Optional[str] = Query(
+        None,
+        description="Search in chat title, username or name (case-insensitive)",
+    ),
+    current_user: AuthorizedUser = Depends(require_authorization),
+    db: AsyncSession = Depends(get_db),
+    params: Params = Depends(),
+) -> Page[Dict[str, Any]]:
+    is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
+
+    requested_bot_ids = await parse_bot_param(bots)
+
+    valid_chat_types = _parse_chat_types(chat_types)
+    search_term = f"%{search}%" if search else None
+
+    last_msg_sub = _accessible_chats_subquery(
+        current_user.id, is_admin, requested_bot_ids, valid_chat_types, search_term
+    )
+
+    # Total count (honours all filters). Access is already checked, so explicit
+    # bot ids scope the count on their own, otherwise it is per user or global
+    if requested_bot_ids:
+        scope: Any = frozenset(requested_bot_ids)
+    else:
+        scope = None if is_admin else current_user.id
+
+    cache_key = (scope, frozenset(valid_chat_types), search_term)
+    total = get_cached_chats_count(cache_key)
+
+    offset = (params.page - 1) * params.size
+    limit = params.size
+
+    stmt, last_msg = _accessible_chats_stmt(last_msg_sub)
+    if total is None:
+        # Without a cached total it comes back with the page as a window count
+        stmt = stmt.add_columns(func.count().over().label("total_count"))
+
+    stmt = stmt.order_by(last_msg.date.desc()).offset(offset).limit(limit)
+
+    rows: Sequence[Any] = (await db.execute(stmt)).all()
+    if not rows:
+        # Requested bots are authorized inside the query, an empty result may
+        # mean the user lacks one of them
+        await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
+
+    if total is None:
+        if rows:
+            total = rows[0].total_count
+            cache_chats_count(cache_key, total)
+            rows = [(chat, message) for chat, message, _ in rows]
+        elif offset:
+            # A page past the end has no rows to carry the window count
+            total = await get_accessible_chats_count(db, last_msg_sub, cache_key)
+        else:
+            total = 0
+
+    items = await _serialize_chat_rows(db, rows, current_user.id)
+
     pages = max(1, (total + params.size - 1) // params.size)
 
     return Page(
@@ -198,6 +278,89 @@ async def list_accessible_chats(
     )
 
 
+@router.get(
+    "/cursor",
+    response_model=Dict[str, Any],
+    responses={
+        403: common_responses[403],
+        401: common_responses[401],
+        400: common_responses[400],
+    },
+)
+@limiter.limit("10/minute")
+async def list_accessible_chats_cursor(
+    request: Request,
+    response: Response,
+    bots: Optional[str] = Query(
+        None,
+        description="Comma-separated bot IDs. If provided, only chats where these bots have messages are included.",
+    ),
+    chat_types: Optional[str] = Query(
+        None,
+        description="Comma-separated chat types to filter: private,group,supergroup,channel",
+    ),
+    search: Optional[str] = Query(
+        None,
+        description="Search in chat title, username or name (case-insensitive)",
+    ),
+    limit: int = Query(50, ge=1, le=100, description="Max number of chats to return"),
+    cursor_date: Optional[datetime] = Query(
+        None,
+        description="Last message date of the previous page's last chat (next_cursor.date). Requires cursor_chat_id.",
+    ),
+    cursor_chat_id: Optional[int] = Query(
+        None,
+        description="Id of the previous page's last chat (next_cursor.chat_id). Requires cursor_date.",
+    ),
+    current_user: AuthorizedUser = Depends(require_authorization),
+    db: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    if (cursor_date is None) != (cursor_chat_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="cursor_date and cursor_chat_id must be provided together",
+        )
+
+    is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
+
+    requested_bot_ids = await parse_bot_param(bots)
+
+    last_msg_sub = _accessible_chats_subquery(
+        current_user.id,
+        is_admin,
+        requested_bot_ids,
+        _parse_chat_types(chat_types),
+        f"%{search}%" if search else None,
+    )
+
+    stmt, last_msg = _accessible_chats_stmt(last_msg_sub)
+    if cursor_date is not None:
+        stmt = stmt.where(
+            tuple_(last_msg.date, TelegramChat.id) < tuple_(cursor_date, cursor_chat_id)
+        )
+
+    stmt = stmt.order_by(last_msg.date.desc(), TelegramChat.id.desc()).limit(
+        limit + 1
+    )
+
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
+
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+
+    items = await _serialize_chat_rows(db, rows, current_user.id)
+
+    next_cursor: Optional[Dict[str, Any]] = None
+    if has_more:
+        last_chat, last_message = rows[-1]
+        next_cursor = {"date": last_message.date, "chat_id": last_chat.id}
+
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
 @router.get(
     "/{chat_id}",
     response_model=Dict[str, Any],
@@ -216,7 +379,6 @@ async def get_chat_info(
 ) -> Dict[str, Any]:
     requested_bot_ids = await parse_bot_param(bots)
     is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
-    await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
 
     bm = BotMessage
     ub = UserBot
@@ -229,7 +391,9 @@ async def get_chat_info(
     ).where(bm.chat_id == chat_id)
 
     if requested_bot_ids:
-        last_msg_sub_stmt = last_msg_sub_stmt.where(bm.bot_id.in_(requested_bot_ids))
+        last_msg_sub_stmt = last_msg_sub_stmt.where(
+            bot_access_filter(current_user.id, requested_bot_ids, is_admin)
+        )
     elif not is_admin:
         last_msg_sub_stmt = last_msg_sub_stmt.join(ub, ub.bot_id == bm.bot_id).where(
             ub.user_id == current_user.id
@@ -241,12 +405,19 @@ async def get_chat_info(
     stmt = (
         select(tc, last_msg, rm.message_thread_id, rm.message_id)
         .join(last_msg_sub, last_msg_sub.c.chat_id == tc.id)
-        .join(last_msg, last_msg.id == last_msg_sub.c.last_message_id)
+        .join(
+            last_msg,
+            and_(
+                last_msg.chat_id == last_msg_sub.c.chat_id,
+                last_msg.id == last_msg_sub.c.last_message_id,
+            ),
+        )
         .outerjoin(rm, and_(rm.chat_id == tc.id, rm.user_id == current_user.id))
         .options(
             joinedload(last_msg.from_user),
             joinedload(last_msg.sender_chat),
             joinedload(last_msg.sender_business_bot),
+            undefer(last_msg.other_data),
         )
     )
 
@@ -254,6 +425,7 @@ async def get_chat_info(
     rows = result.all()
 
     if not rows:
+        await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
         raise HTTPException(
             status_code=404, detail="Chat not found or no accessible messages"
         )
@@ -298,6 +470,12 @@ async def get_chat_avatar(
     else:
         bot_id, telegram_bot = await get_bot_by_chat(db, chat_id, current_user)
 
+    cache_headers = {"Cache-Control": f"private, max-age={AVATAR_MAX_AGE}"}
+
+    etag = get_avatar_etag(chat_id)
+    if etag is not None and etag_matches(request, etag):
+        return Response(status_code=304, headers={**cache_headers, "ETag": etag})
+
     try:
         chat_info = await telegram_bot.get_chat(chat_id)
     except Exception as e:
@@ -308,16 +486,25 @@ async def get_chat_avatar(
     await db.commit()
 
     if not chat_info.photo:
+        set_avatar_etag(chat_id, None)
         raise HTTPException(status_code=404, detail="Avatar not found")
 
+    # The unique file id changes whenever the photo does, so it makes a stable ETag
+    etag = f'"{chat_info.photo.small_file_unique_id}"'
+    set_avatar_etag(chat_id, etag)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={**cache_headers, "ETag": etag})
+
     try:
         avatar = await chat_info.photo.get_small_file()
-        avatar_bytes = await avatar.download_as_bytearray()
     except Exception as e:
         logger.error(e)
         raise HTTPException(status_code=502, detail="Telegram API Error")
 
-    return Response(content=bytes(avatar_bytes), media_type="image/jpeg")
+    avatar_response = await stream_telegram_file(avatar, "image/jpeg")
+    avatar_response.headers.update({**cache_headers, "ETag": etag})
+
+    return avatar_response
 
 
 @router.get(
@@ -345,6 +532,10 @@ async def list_chat_messages_cursor(
         None,
         description="Fetch messages with message_id > after_id in ascending order (load newer). Mutually exclusive with before_id.",
     ),
+    include_other_data: bool = Query(
+        True,
+        description="Include additional message fields (entities, media, etc.) stored outside the main columns.",
+    ),
     current_user: AuthorizedUser = Depends(require_authorization),
     db: AsyncSession = Depends(get_db),
 ) -> Dict[str, Any]:
@@ -356,7 +547,6 @@ async def list_chat_messages_cursor(
 
     requested_bot_ids = await parse_bot_param(bots)
     is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
-    await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
 
     tm = TelegramMessage
     bm = BotMessage
@@ -367,15 +557,13 @@ async def list_chat_messages_cursor(
         select(tm)
         .join(bm, join_condition)
         .where(bm.chat_id == chat_id)
-        .options(
-            joinedload(tm.from_user),
-            joinedload(tm.sender_chat),
-            joinedload(tm.sender_business_bot),
-        )
+        .options(*get_message_options(include_other_data))
     )
 
     if requested_bot_ids:
-        base_stmt = base_stmt.where(bm.bot_id.in_(requested_bot_ids))
+        base_stmt = base_stmt.where(
+            bot_access_filter(current_user.id, requested_bot_ids, is_admin)
+        )
     elif not is_admin:
         base_stmt = base_stmt.join(ub, ub.bot_id == bm.bot_id).where(
             ub.user_id == current_user.id
@@ -388,6 +576,8 @@ async def list_chat_messages_cursor(
         stmt = base_stmt.where(tm.id > after_id).order_by(tm.id.asc()).limit(limit + 1)
         result = await db.execute(stmt)
         messages = result.scalars().all()
+        if not messages:
+            await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
 
         has_more_newer = len(messages) > limit
         if has_more_newer:
@@ -396,7 +586,7 @@ async def list_chat_messages_cursor(
         # Assume there are older messages if after_id > 0
         has_more_older = after_id > 0
 
-        items = [serialize_message(m) for m in messages]
+        items = [serialize_message(m, include_other_data) for m in messages]
 
         return {
             "items": items,
@@ -414,6 +604,7 @@ async def list_chat_messages_cursor(
         messages = result.scalars().all()
 
         if not messages:
+            await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
             raise HTTPException(
                 status_code=404, detail="Chat not found or no accessible messages"
             )
@@ -424,7 +615,7 @@ async def list_chat_messages_cursor(
 
         has_more_newer = before_id is not None
 
-        items = [serialize_message(m) for m in messages]
+        items = [serialize_message(m, include_other_data) for m in messages]
 
         return {
             "items": items,
@@ -452,7 +643,6 @@ async def mark_chat_read(
     tm = TelegramMessage
     bm = BotMessage
     ub = UserBot
-    rm = ReadMessages
 
     thread_id = body.message_thread_id or 1
 
@@ -487,35 +677,17 @@ async def mark_chat_read(
             detail=f"message_id {final_message_id} is greater than last message id {last_message_id}",
         )
 
-    existing_q = select(
-        exists().where(
-            rm.user_id == current_user.id,
-            rm.chat_id == chat_id,
-            rm.message_thread_id == thread_id,
-        )
+    await bulk_mark_read(
+        db,
+        [
+            {
+                "user_id": current_user.id,
+                "chat_id": chat_id,
+                "message_thread_id": thread_id,
+                "message_id": final_message_id,
+            }
+        ],
     )
-    existing_row = (await db.execute(existing_q)).scalar()
-
-    if existing_row:
-        upd_stmt = (
-            update(rm)
-            .where(
-                rm.user_id == current_user.id,
-                rm.chat_id == chat_id,
-                rm.message_thread_id == thread_id,
-            )
-            .values(message_id=final_message_id)
-        )
-        await db.execute(upd_stmt)
-    else:
-        ins_stmt = insert(rm).values(
-            user_id=current_user.id,
-            chat_id=chat_id,
-            message_thread_id=thread_id,
-            message_id=final_message_id,
-        )
-        await db.execute(ins_stmt)
-
     await db.commit()
 
     return Response(status_code=204)
@@ -537,25 +709,18 @@ async def delete_chat_read_marks(
 ) -> Response:
     is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
 
-    tm = TelegramMessage
     bm = BotMessage
     ub = UserBot
     rm = ReadMessages
 
-    join_condition = and_(bm.chat_id == tm.chat_id, bm.message_id == tm.id)
-    accessible_q = (
-        select(func.count())
-        .select_from(tm)
-        .join(bm, join_condition)
-        .where(bm.chat_id == chat_id)
-    )
+    # bot_messages references telegram_messages, so one accessible row is enough
+    accessible_q = select(bm.chat_id).where(bm.chat_id == chat_id)
     if not is_admin:
         accessible_q = accessible_q.join(ub, ub.bot_id == bm.bot_id).where(
             ub.user_id == current_user.id
         )
 
-    accessible_count = (await db.execute(accessible_q)).scalar_one()
-    if accessible_count == 0:
+    if not await db.scalar(select(accessible_q.exists())):
         raise HTTPException(
             status_code=404, detail="Chat not found or no accessible messages"
         )
@@ -589,7 +754,6 @@ async def list_chat_threads(
     """List all message threads in a chat, similar to Telegram's topic list."""
     requested_bot_ids = await parse_bot_param(bots)
     is_admin = current_user.role in (UserRole.ADMIN, UserRole.GOD)
-    await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
 
     tm = TelegramMessage
     bm = BotMessage
@@ -605,7 +769,9 @@ async def list_chat_threads(
     )
 
     if requested_bot_ids:
-        base_stmt = base_stmt.where(bm.bot_id.in_(requested_bot_ids))
+        base_stmt = base_stmt.where(
+            bot_access_filter(current_user.id, requested_bot_ids, is_admin)
+        )
     elif not is_admin:
         base_stmt = base_stmt.join(ub, ub.bot_id == bm.bot_id).where(
             ub.user_id == current_user.id
@@ -617,6 +783,7 @@ async def list_chat_threads(
     messages = result.scalars().all()
 
     if not messages:
+        await check_bot_access(db, current_user.id, requested_bot_ids, is_admin)
         return {"items": []}
 
     # Group messages by thread_id and get the latest message for each thread
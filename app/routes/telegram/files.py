@@ -11,6 +11,7 @@ from app.schemas.telegram.file import FileInfoResponse
 from app.services.telegram.bots import (
     get_file_and_bot_token,
     get_telegram_bot_from_encrypted,
+    stream_telegram_file,
 )
 
 router = APIRouter(prefix="/files", tags=["telegram-files"])
@@ -51,7 +52,7 @@ async def get_file(
     bot_file, token = await get_file_and_bot_token(
         db, file_unique_id, current_user, bot_id, preload_file=True
     )
-    telegram_bot = get_telegram_bot_from_encrypted(bot_file.bot_id, token)
+    telegram_bot = await get_telegram_bot_from_encrypted(bot_file.bot_id, token)
 
     try:
         file = await telegram_bot.get_file(bot_file.file_id)
@@ -59,10 +60,9 @@ async def get_file(
         logger.error(e)
         raise HTTPException(status_code=502, detail="Telegram API error")
 
-    file_bytes = await file.download_as_bytearray()
     media_type = bot_file.file.mime_type or "application/octet-stream"
 
-    return Response(content=bytes(file_bytes), media_type=media_type)
+    return await stream_telegram_file(file, media_type)
 
 
 @router.get(
@@ -81,7 +81,7 @@ async def get_user_avatar(
         raise HTTPException(status_code=404, detail="User not found or not accessible")
 
     bot_id, token = row
-    telegram_bot = get_telegram_bot_from_encrypted(bot_id, token)
+    telegram_bot = await get_telegram_bot_from_encrypted(bot_id, token)
 
     try:
         # get_chat on a user_id returns private chat info including profile photo
@@ -2,17 +2,18 @@ from typing import Any, Dict, Union
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import require_authorization, require_role
 from app.core.enums import UserRole
 from app.core.limiter import limiter
 from app.core.utils import update_user_bool_field
+from app.db.models.session import Session
 from app.db.models.user import User
 from app.db.session import get_db
 from app.schemas.user import UserResponse, UserUpdateRequest
+from app.services.auth import invalidate_user_cache
 from app.services.bloom_filter import bloom_filter
 from app.schemas.auth import AuthorizedUser
 
@@ -105,6 +106,7 @@ async def update_user(
         setattr(user, key, value)
 
     await db.commit()
+    invalidate_user_cache(user.id)
 
     return UserResponse.model_validate(user)
 
@@ -125,20 +127,20 @@ async def delete_user(
     if authorized_user.id != user_id and authorized_user.role != UserRole.GOD:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    q = await db.execute(
-        select(User).options(joinedload(User.sessions)).where(User.id == user_id)
-    )
-    user = q.unique().scalar_one_or_none()
+    q = await db.execute(select(Session.access_jti).where(Session.user_id == user_id))
+    access_jtis = q.scalars().all()
 
-    if not user:
+    # Sessions, bot links, OTP codes and read marks are removed by ON DELETE CASCADE
+    q = await db.execute(delete(User).where(User.id == user_id).returning(User.id))
+    if q.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    for session in user.sessions:
-        bloom_filter.add(session.access_jti)
-
-    await db.delete(user)
     await db.commit()
 
+    bloom_filter.add_many(access_jtis)
+
+    invalidate_user_cache(user_id)
+
     return Response(status_code=204)
 
 
@@ -158,6 +160,7 @@ async def ban_user(
     user = await update_user_bool_field(
         authorized_user, user_id, db, "is_banned", True, "User is already banned"
     )
+    invalidate_user_cache(user.id)
 
     return UserResponse.model_validate(user)
 
@@ -178,6 +181,7 @@ async def unban_user(
     user = await update_user_bool_field(
         authorized_user, user_id, db, "is_banned", False, "User is not banned"
     )
+    invalidate_user_cache(user.id)
 
     return UserResponse.model_validate(user)
 
@@ -206,6 +210,7 @@ async def verify_email(
         True,
         "User email is already verified",
     )
+    invalidate_user_cache(user.id)
 
     return UserResponse.model_validate(user)
 
@@ -231,5 +236,6 @@ async def revoke_email_verification(
         False,
         "User email is not verified",
     )
+    invalidate_user_cache(user.id)
 
     return UserResponse.model_validate(user)
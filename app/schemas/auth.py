@@ -1,4 +1,3 @@
-import re
 from typing import List, Optional, Annotated
 from datetime import datetime
 from pydantic import (
@@ -12,7 +11,7 @@ from pydantic import (
 
 from app.core.settings import settings
 from app.core.enums import UserRole
-from app.core.constants import PASSWORD_REGEX, USERNAME_REGEX
+from app.core.constants import PASSWORD_RE, USERNAME_RE
 from app.db.models.user import User
 
 
@@ -26,15 +25,15 @@ class RegisterRequest(BaseModel):
         return v.strip() if isinstance(v, str) else v
 
     @field_validator("username")
-    def validate_username(cls: "RegisterRequest", v: Optional[str]) -> str:
-        if not v or not re.fullmatch(USERNAME_REGEX, v):
+    def validate_username(cls: "RegisterRequest", v: str) -> str:
+        if not USERNAME_RE.fullmatch(v):
             raise ValueError("Invalid format")
 
         return v
 
     @field_validator("password")
     def validate_password(cls: "RegisterRequest", v: str) -> str:
-        if not re.fullmatch(PASSWORD_REGEX, v):
+        if not PASSWORD_RE.fullmatch(v):
             raise ValueError(
                 "Password must contain at least 1 uppercase letter, "
                 "1 lowercase letter, 1 digit, and be 8-32 characters long."
@@ -54,14 +53,14 @@ class LoginRequest(BaseModel):
 
     @field_validator("username")
     def validate_username(cls: "LoginRequest", v: Optional[str]) -> Optional[str]:
-        if v and not re.fullmatch(USERNAME_REGEX, v):
+        if v and not USERNAME_RE.fullmatch(v):
             raise ValueError("Invalid format")
 
         return v
 
     @field_validator("password")
     def validate_password(cls: "LoginRequest", v: str) -> str:
-        if not re.fullmatch(PASSWORD_REGEX, v):
+        if not PASSWORD_RE.fullmatch(v):
             raise ValueError(
                 "Password must contain at least 1 uppercase letter, "
                 "1 lowercase letter, 1 digit, and be 8-32 characters long."
@@ -1,4 +1,3 @@
-import re
 from pydantic import (
     BaseModel,
     EmailStr,
@@ -11,7 +10,7 @@ from typing import Annotated, List, Optional
 
 from telegram import Update
 
-from app.core.constants import BOT_TOKEN_REGEX, USERNAME_REGEX, WEBHOOK_SECRET_REGEX
+from app.core.constants import BOT_TOKEN_RE, USERNAME_RE, WEBHOOK_SECRET_RE
 from app.core.enums import UserBotRole
 
 
@@ -20,7 +19,7 @@ class BotTokenRequest(BaseModel):
 
     @field_validator("token")
     def validate_telegram_token(cls: "BotTokenRequest", v: Optional[str]) -> str:
-        if not v or not re.match(BOT_TOKEN_REGEX, v):
+        if not v or not BOT_TOKEN_RE.fullmatch(v):
             raise ValueError("Invalid Telegram bot token format")
 
         return v
@@ -71,7 +70,7 @@ class UserBotUpdateRequest(BaseModel):
     def validate_username(
         cls: "UserBotUpdateRequest", v: Optional[str]
     ) -> Optional[str]:
-        if v and not re.fullmatch(USERNAME_REGEX, v):
+        if v and not USERNAME_RE.fullmatch(v):
             raise ValueError("Invalid format")
 
         return v
@@ -98,7 +97,7 @@ class WebhookCreateRequest(BaseModel):
     def validate_secret_token(
         cls: "WebhookCreateRequest", v: Optional[str]
     ) -> Optional[str]:
-        if v is not None and not re.match(WEBHOOK_SECRET_REGEX, v):
+        if v is not None and not WEBHOOK_SECRET_RE.fullmatch(v):
             raise ValueError("Invalid secret token format")
 
         return v
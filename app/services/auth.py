@@ -1,16 +1,23 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional, Tuple, Union
 from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy import delete, func, select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, make_transient_to_detached, raiseload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import jwt
-from fastapi import HTTPException
+from cachetools import TTLCache
+from fastapi import BackgroundTasks, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 from secrets import token_urlsafe
 
 from app.core.utils import generate_numeric_otp
+from app.db.dml import upsert
 from app.db.models.otp_code import OtpCode
 from app.db.models.session import Session
 from app.db.models.user import User
@@ -21,16 +28,50 @@ from app.core.settings import settings
 from app.core.enums import OtpCodeType, TokenType, UserRole
 from app.services.bloom_filter import bloom_filter
 
+# New hashes use Argon2id; bcrypt is kept to verify (and upgrade) legacy hashes
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=2,
+    argon2__memory_cost=64 * 1024,
+    argon2__parallelism=2,
+)
+
+# argon2-cffi and bcrypt release the GIL, so threads scale across cores without the
+# pickling cost of a process pool and stay off the default threadpool
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    thread_name_prefix="password-hash",
+)
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, pwd_context.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, pwd_context.verify, password, password_hash
+    )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+async def dummy_verify_password() -> None:
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_password_executor, pwd_context.dummy_verify)
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
+async def verify_and_update_password(
+    password: str, password_hash: str
+) -> Tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    verified, new_hash = await loop.run_in_executor(
+        _password_executor, pwd_context.verify_and_update, password, password_hash
+    )
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+    return verified, new_hash
 
 
 def create_jwt_token(
@@ -67,7 +108,10 @@ def create_jwt_token(
     return token
 
 
-def decode_jwt_token(token: str) -> Dict[str, Any]:
+_jwt_cache: TTLCache[str, Dict[str, Any]] = TTLCache(maxsize=10000, ttl=30)
+
+
+def _verify_jwt_token(token: str) -> Dict[str, Any]:
     try:
         payload: Dict[str, Any] = jwt.decode(
             token,
@@ -80,23 +124,35 @@ def decode_jwt_token(token: str) -> Dict[str, Any]:
                 "verify_iss": bool(settings.JWT_ISSUER),
             },
         )
-
-        jti = payload.get("jti")
-        if jti is None or jti in bloom_filter:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    return payload
+
+
+async def decode_jwt_token(token: str) -> Dict[str, Any]:
+    payload = _jwt_cache.get(token)
+    if payload is None:
+        payload = await run_in_threadpool(_verify_jwt_token, token)
+        _jwt_cache[token] = payload
+    elif payload.get("exp", float("inf")) <= time.time():
+        raise HTTPException(status_code=401, detail="Token expired")
+
+    # Revocation is checked on every call, cached or not
+    jti = payload.get("jti")
+    if jti is None or jti in bloom_filter:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return payload
+
 
-def authorize_user(
+async def authorize_user(
     credentials: HTTPAuthorizationCredentials,
     role: Optional[UserRole] = None,
 ) -> AuthorizedUser:
-    payload = decode_jwt_token(credentials.credentials)
+    payload = await decode_jwt_token(credentials.credentials)
     if payload.get("type") != TokenType.ACCESS:
         raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -126,8 +182,10 @@ def authorize_user(
     )
 
 
-def validate_refresh_token(credentials: HTTPAuthorizationCredentials) -> Dict[str, Any]:
-    payload = decode_jwt_token(credentials.credentials)
+async def validate_refresh_token(
+    credentials: HTTPAuthorizationCredentials,
+) -> Dict[str, Any]:
+    payload = await decode_jwt_token(credentials.credentials)
 
     if payload.get("type") != TokenType.REFRESH:
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -138,17 +196,39 @@ def validate_refresh_token(credentials: HTTPAuthorizationCredentials) -> Dict[st
     return payload
 
 
+_user_cache: TTLCache[str, Dict[str, Any]] = TTLCache(maxsize=8192, ttl=5)
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    for jti, values in list(_user_cache.items()):
+        if values["id"] == user_id:
+            _user_cache.pop(jti, None)
+
+
 async def authorize_user_db(
     credentials: HTTPAuthorizationCredentials,
     db: AsyncSession,
     role: Optional[UserRole] = None,
 ) -> AuthorizedUserDb:
-    authorized_user = authorize_user(credentials, role)
+    authorized_user = await authorize_user(credentials, role)
 
-    q = await db.execute(select(User).where(User.id == authorized_user.id))
-    user = q.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    values = _user_cache.get(authorized_user.jti)
+    if values is None:
+        q = await db.execute(
+            select(User).options(raiseload("*")).where(User.id == authorized_user.id)
+        )
+        user = q.scalar_one_or_none()
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        _user_cache[authorized_user.jti] = {
+            attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs
+        }
+    else:
+        # Attach a copy of the cached row to this session without a SELECT
+        cached_user = User(**values)
+        make_transient_to_detached(cached_user)
+        user = await db.merge(cached_user, load=False)
 
     if role and role != user.role and user.role != UserRole.GOD:
         raise HTTPException(status_code=403, detail="Forbidden")
@@ -238,13 +318,16 @@ async def rotate_refresh_token(
     return await issue_token_pair(db, session.user, session_name, session)
 
 
-async def revoke_all_sessions(db: AsyncSession, user_id: int) -> None:
-    q = await db.execute(select(Session.access_jti).where(Session.user_id == user_id))
-    for (access_jti,) in q.all():
-        bloom_filter.add(access_jti)
+async def revoke_all_sessions(
+    db: AsyncSession, user_id: int, commit: bool = True
+) -> None:
+    q = await db.scalars(
+        delete(Session).where(Session.user_id == user_id).returning(Session.access_jti)
+    )
+    bloom_filter.add_many(q.all())
 
-    await db.execute(delete(Session).where(Session.user_id == user_id))
-    await db.commit()
+    if commit:
+        await db.commit()
 
 
 async def revoke_session_by_jti(db: AsyncSession, jti: str) -> None:
@@ -262,50 +345,49 @@ async def issue_otp(
     db: AsyncSession,
     user_id: int,
     type: OtpCodeType,
+    commit: bool = True,
 ) -> str:
     otp_value = generate_numeric_otp(settings.OTP_LENGTH)
 
+    # Replaces any previous code of this type in a single statement
     await db.execute(
-        delete(OtpCode).where(OtpCode.user_id == user_id, OtpCode.type == type)
-    )
-    db.add(
-        OtpCode(
-            user_id=user_id,
-            type=type,
-            code=otp_value,
+        upsert(OtpCode, ("user_id", "type"), ("code",), created_at=func.now()).values(
+            user_id=user_id, type=type, code=otp_value
         )
     )
-    await db.commit()
+    if commit:
+        await db.commit()
 
     return otp_value
 
 
 async def send_verification_email(
-    db: AsyncSession, user: Union[User, UserResponse]
+    db: AsyncSession,
+    user: Union[User, UserResponse],
+    background_tasks: BackgroundTasks,
 ) -> None:
     if user.email_verified:
         return
 
     otp = await issue_otp(db, user.id, OtpCodeType.VERIFY_EMAIL)
 
-    await send_email(user.email, "Verify your email", "confirm", user.username, otp)
+    background_tasks.add_task(
+        send_email, user.email, "Verify your email", "confirm", user.username, otp
+    )
 
 
 async def logout_current_session(
     current_user: AuthorizedUser, db: AsyncSession
 ) -> None:
-    session = (
-        await db.execute(
-            select(Session).filter_by(
-                user_id=current_user.id, access_jti=current_user.jti
-            )
-        )
-    ).scalar_one_or_none()
+    session_id = await db.scalar(
+        delete(Session)
+        .filter_by(user_id=current_user.id, access_jti=current_user.jti)
+        .returning(Session.id)
+    )
 
     bloom_filter.add(current_user.jti)
 
-    if not session:
+    if session_id is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    await db.delete(session)
     await db.commit()
@@ -1,3 +1,71 @@
-from pybloom_live import BloomFilter  # type: ignore[import-untyped]
+import math
+from typing import Iterable, Tuple
+
+import xxhash
+
+_MASK_64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._rounds = range(self.num_hashes)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _probe(self, key: str) -> Tuple[int, int]:
+        # Kirsch-Mitzenmacher: all k positions come from one 128-bit hash as
+        # start + i * step, kept below num_bits so the loop stays on small ints
+        digest = xxhash.xxh3_128_intdigest(key.encode())
+        num_bits = self.num_bits
+        step = (digest >> 64) % num_bits or 1
+
+        return (digest & _MASK_64) % num_bits, step
+
+    def add(self, key: str) -> None:
+        bits = self._bits
+        num_bits = self.num_bits
+        index, step = self._probe(key)
+        for _ in self._rounds:
+            bits[index >> 3] |= 1 << (index & 7)
+            index += step
+            if index >= num_bits:
+                index -= num_bits
+
+        self.count += 1
+
+    def add_many(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+
+        bits = self._bits
+        num_bits = self.num_bits
+        index, step = self._probe(key)
+        for _ in self._rounds:
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+
+            index += step
+            if index >= num_bits:
+                index -= num_bits
+
+        return True
+
+    def __len__(self) -> int:
+        return self.count
+
 
 bloom_filter = BloomFilter(capacity=1000000, error_rate=0.0001)
@@ -1,6 +1,6 @@
-import httpx
 from typing import Literal
 
+from app.core.http_client import http_client
 from app.core.settings import settings
 
 
@@ -20,6 +20,7 @@ async def send_email(
         "otp": otp,
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(settings.MAILER_URL, json=payload, headers=headers)
-        response.raise_for_status()
+    response = await http_client.post(
+        settings.MAILER_URL, json=payload, headers=headers
+    )
+    response.raise_for_status()
@@ -1,38 +1,66 @@
-from typing import Optional, Tuple
-
-from fastapi import HTTPException
-from sqlalchemy import delete, func, select, tuple_
-from sqlalchemy.orm import joinedload, selectinload
+import asyncio
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import bindparam, delete, exists, func, select, tuple_
+from sqlalchemy.orm import joinedload, raiseload
 from sqlalchemy.ext.asyncio import AsyncSession
-from telegram import Bot as TelegramBot
+from starlette.background import BackgroundTask
+from telegram import Bot as TelegramBot, File
 
+from app.core.constants import BOT_TOKEN_INFO
 from app.core.crypto import crypto
+from app.core.http_client import http_client, telegram_request
+from app.core.logger import logger
 from app.core.settings import settings
-from app.core.enums import CryptoInfo, UserBotRole, UserRole
+from app.core.enums import UserBotRole, UserRole
 from app.db.models.telegram.bot import Bot
 from app.db.models.telegram.bot_message import BotMessage
 from app.db.models.telegram.bot_file import BotFile
+from app.db.models.telegram.user import TelegramUser
 from app.db.models.user_bot import UserBot
 from app.schemas.auth import AuthorizedUser
 from app.schemas.telegram.bot import BotResponse
 
+# Caps concurrent redirect requests so slow targets can't pile up unbounded
+_forward_semaphore = asyncio.Semaphore(settings.WEBHOOK_MAX_INFLIGHT)
+
 
+@lru_cache(maxsize=1024)
 def get_telegram_bot(token: str) -> TelegramBot:
     return TelegramBot(
         token,
         base_url=str(settings.TELEGRAM_API_URL),
         base_file_url=str(settings.TELEGRAM_API_FILE_URL),
+        request=telegram_request,
+        get_updates_request=telegram_request,
     )
 
 
-def get_telegram_bot_from_encrypted(bot_id: int, token: bytes) -> TelegramBot:
-    bot_token_stripped = crypto.decrypt_data(token, CryptoInfo.BOT_TOKEN)
+async def get_telegram_bot_from_encrypted(bot_id: int, token: bytes) -> TelegramBot:
+    bot_token_stripped = await crypto.decrypt_data_async(token, BOT_TOKEN_INFO)
     bot_token = f"{bot_id}:{bot_token_stripped}"
     telegram_bot = get_telegram_bot(bot_token)
 
     return telegram_bot
 
 
+async def forward_update(url: str, body: bytes, headers: Dict[str, str]) -> None:
+    async with _forward_semaphore:
+        try:
+            await http_client.post(
+                url,
+                content=body,
+                headers=headers,
+                timeout=settings.WEBHOOK_REDIRECT_TIMEOUT,
+            )
+        except Exception as e:
+            logger.error(e)
+
+
 async def get_user_bot(
     bot_id: int,
     current_user: AuthorizedUser,
@@ -48,12 +76,11 @@ async def get_user_bot(
 
     options = []
     if preload_webhook:
-        options.append(selectinload(Bot.webhook))
+        options.append(joinedload(Bot.webhook))
     if preload_telegram_user:
-        options.append(selectinload(Bot.telegram_user))
+        options.append(joinedload(Bot.telegram_user))
 
-    if options:
-        stmt = stmt.options(*options)
+    stmt = stmt.options(*options, raiseload("*"))
 
     row = (await db.execute(stmt)).one_or_none()
 
@@ -77,6 +104,50 @@ async def get_userbot_mapping(
     return (await session.execute(stmt)).scalar_one_or_none()
 
 
+# Columns matching BotResponse fields, add UserBot.role to complete a row
+BOT_RESPONSE_COLUMNS = (
+    Bot.id,
+    TelegramUser.first_name,
+    TelegramUser.last_name,
+    TelegramUser.username,
+    Bot.can_join_groups,
+    Bot.can_read_all_group_messages,
+    Bot.supports_inline_queries,
+    Bot.can_connect_to_business,
+    Bot.has_main_web_app,
+)
+
+
+USERBOT_ROLE = select(UserBot.role).where(
+    UserBot.bot_id == bindparam("bot_id"), UserBot.user_id == bindparam("user_id")
+)
+
+
+async def get_userbot_role(
+    session: AsyncSession, bot_id: int, user_id: int
+) -> Optional[UserBotRole]:
+    role: Optional[UserBotRole] = await session.scalar(
+        USERBOT_ROLE, {"bot_id": bot_id, "user_id": user_id}
+    )
+
+    return role
+
+
+async def require_bot_owner(
+    session: AsyncSession, bot_id: int, current_user: AuthorizedUser
+) -> None:
+    if current_user.role in (UserRole.ADMIN, UserRole.GOD):
+        bot_exists = await session.scalar(select(exists().where(Bot.id == bot_id)))
+        if not bot_exists:
+            raise HTTPException(status_code=404, detail="Bot not found")
+
+        return
+
+    role = await get_userbot_role(session, bot_id, current_user.id)
+    if role != UserBotRole.OWNER:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
 def make_bot_response(bot: Bot, role: Optional[UserBotRole]) -> BotResponse:
     return BotResponse(
         id=bot.id,
@@ -144,7 +215,7 @@ async def get_bot_by_id(
             raise HTTPException(status_code=403, detail="Forbidden")
 
     bot_id, token = row
-    telegram_bot = get_telegram_bot_from_encrypted(bot_id, token)
+    telegram_bot = await get_telegram_bot_from_encrypted(bot_id, token)
 
     return telegram_bot
 
@@ -178,11 +249,42 @@ async def get_bot_by_chat(
         )
 
     bot_id, token = row
-    telegram_bot = get_telegram_bot_from_encrypted(bot_id, token)
+    telegram_bot = await get_telegram_bot_from_encrypted(bot_id, token)
 
     return (bot_id, telegram_bot)
 
 
+async def stream_telegram_file(file: File, media_type: str) -> Response:
+    # A local Bot API server hands out paths on disk, python-telegram-bot reads them
+    if not file.file_path or not file.file_path.startswith(("http://", "https://")):
+        file_bytes = await file.download_as_bytearray()
+        return Response(content=bytes(file_bytes), media_type=media_type)
+
+    request = http_client.build_request(
+        "GET", file.file_path, timeout=settings.TELEGRAM_API_REDIRECT_TIMEOUT
+    )
+    try:
+        resp = await http_client.send(request, stream=True)
+    except httpx.HTTPError as e:
+        logger.error(e)
+        raise HTTPException(status_code=502, detail="Telegram API error")
+
+    if resp.status_code != 200:
+        await resp.aclose()
+        raise HTTPException(status_code=502, detail="Telegram API error")
+
+    headers = {}
+    if "content-length" in resp.headers:
+        headers["Content-Length"] = resp.headers["content-length"]
+
+    return StreamingResponse(
+        resp.aiter_bytes(65536),
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(resp.aclose),
+    )
+
+
 async def get_file_and_bot_token(
     db: AsyncSession,
     file_unique_id: str,
@@ -1,10 +1,15 @@
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from cachetools import TTLCache
 from fastapi import HTTPException
-from sqlalchemy import func, select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import ColumnElement, Subquery, and_, func, select
+from sqlalchemy.orm import defer, raiseload, selectinload, undefer
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.settings import settings
+from app.db.dml import upsert
+from app.db.models.telegram.bot_message import BotMessage
 from app.db.models.telegram.message import TelegramMessage
+from app.db.models.telegram.read_messages import ReadMessages
 from app.db.models.user_bot import UserBot
 
 
@@ -40,8 +45,69 @@ async def check_bot_access(
         )
 
 
-def serialize_message(message: TelegramMessage) -> Dict[str, Any]:
-    data = message.to_dict()
+def bot_access_filter(
+    user_id: int, requested_bot_ids: Set[int], is_admin: bool
+) -> ColumnElement[bool]:
+    bot_filter = BotMessage.bot_id.in_(requested_bot_ids)
+    if is_admin:
+        return bot_filter
+
+    # Same rule as check_bot_access, evaluated once inside the listing query:
+    # rows only come back when the user is linked to every requested bot
+    owned_count = (
+        select(func.count(UserBot.bot_id.distinct()))
+        .where(UserBot.user_id == user_id, UserBot.bot_id.in_(requested_bot_ids))
+        .scalar_subquery()
+    )
+
+    return and_(bot_filter, owned_count == len(requested_bot_ids))
+
+
+_chats_count_cache: TTLCache[Tuple[Any, ...], int] = TTLCache(maxsize=4096, ttl=30)
+
+
+def get_cached_chats_count(cache_key: Tuple[Any, ...]) -> Optional[int]:
+    return _chats_count_cache.get(cache_key)
+
+
+def cache_chats_count(cache_key: Tuple[Any, ...], total: int) -> None:
+    # Small counts are cheap to recompute, so only large ones go stale for a while
+    if total >= settings.CHATS_COUNT_CACHE_MIN:
+        _chats_count_cache[cache_key] = total
+
+
+async def get_accessible_chats_count(
+    db: AsyncSession, chats_sub: Subquery, cache_key: Tuple[Any, ...]
+) -> int:
+    total = get_cached_chats_count(cache_key)
+    if total is not None:
+        return total
+
+    total = (await db.execute(select(func.count()).select_from(chats_sub))).scalar_one()
+    cache_chats_count(cache_key, total)
+
+    return total
+
+
+# chat_id -> ETag of the avatar served last, so revalidations can skip Telegram
+_avatar_etags: TTLCache[int, str] = TTLCache(maxsize=10000, ttl=3600)
+
+
+def get_avatar_etag(chat_id: int) -> Optional[str]:
+    return _avatar_etags.get(chat_id)
+
+
+def set_avatar_etag(chat_id: int, etag: Optional[str]) -> None:
+    if etag is None:
+        _avatar_etags.pop(chat_id, None)
+    else:
+        _avatar_etags[chat_id] = etag
+
+
+def serialize_message(
+    message: TelegramMessage, include_other_data: bool = True
+) -> Dict[str, Any]:
+    data = message.to_dict(merge=include_other_data)
     data.pop("chat", None)
 
     if message.from_user:
@@ -54,9 +120,27 @@ def serialize_message(message: TelegramMessage) -> Dict[str, Any]:
     return data
 
 
-def get_message_options() -> List[Any]:
-    return [
-        joinedload(TelegramMessage.from_user),
-        joinedload(TelegramMessage.sender_chat),
-        joinedload(TelegramMessage.sender_business_bot),
+def get_message_options(include_other_data: bool = True) -> List[Any]:
+    options: List[Any] = [
+        selectinload(TelegramMessage.from_user),
+        selectinload(TelegramMessage.sender_chat),
+        selectinload(TelegramMessage.sender_business_bot),
+        raiseload("*"),
+        (
+            undefer(TelegramMessage.other_data)
+            if include_other_data
+            else defer(TelegramMessage.other_data, raiseload=True)
+        ),
     ]
+
+    return options
+
+
+async def bulk_mark_read(db: AsyncSession, entries: List[Dict[str, int]]) -> None:
+    stmt = upsert(
+        ReadMessages,
+        ("user_id", "chat_id", "message_thread_id"),
+        ("message_id",),
+        updated_at=func.now(),
+    )
+    await db.execute(stmt, entries)
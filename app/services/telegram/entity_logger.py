@@ -32,14 +32,22 @@ from telegram import (
     Voice,
 )
 
-from app.core.enums import ChatType, EntityCheckResultType, FileType, MessageType
+from app.core.enums import (
+    ChatType,
+    EntityCheckResultType,
+    FileType,
+    MessageType,
+)
+from app.core.constants import MESSAGE_FLAG_FIELDS
 from app.core.utils import (
+    attributes_collector,
     deduplicate,
     deduplicate_compound,
-    find_instances,
-    find_objects_with_attributes,
+    instances_collector,
     remove_fields,
+    walk_objects,
 )
+from app.db.dml import insert_ignore_conflicts
 from app.db.models.telegram.bot_message import BotMessage
 from app.db.models.telegram.bot_file import BotFile
 from app.db.models.telegram.chat import TelegramChat
@@ -317,16 +325,16 @@ def collect_entities(
     Dict[Tuple[int, int], Message],
     Dict[str, Dict[str, Any]],
 ]:
-    users = find_instances(object, UpdateUser)
-    unique_users = deduplicate(users, "id")
+    users, visit_users = instances_collector(UpdateUser)
+    chats, visit_chats = instances_collector(Chat)
+    messages, visit_messages = instances_collector(Message)
+    files, visit_files = attributes_collector(("file_unique_id", "file_id"))
 
-    chats = find_instances(object, Chat)
-    unique_chats = deduplicate(chats, "id")
+    walk_objects(object, (visit_users, visit_chats, visit_messages, visit_files))
 
-    messages = find_instances(object, Message)
+    unique_users = deduplicate(users, "id")
+    unique_chats = deduplicate(chats, "id")
     unique_messages = deduplicate_compound(messages, ("chat_id", "id"))
-
-    files = find_objects_with_attributes(object, ("file_unique_id", "file_id"))
     unique_files = deduplicate(files, "file_unique_id")
 
     unique_files_json: Dict[str, Dict[str, Any]] = {}
@@ -454,6 +462,15 @@ def get_message_type(message: Message) -> MessageType:
     return MessageType.SERVICE
 
 
+def get_message_flags(message: Message) -> int:
+    flags = 0
+    for attr, flag in MESSAGE_FLAG_FIELDS:
+        if getattr(message, attr):
+            flags |= flag
+
+    return int(flags)
+
+
 def get_message_excluded_fields(message: Message) -> Set[str]:
     excluded_fields = {
         "message_id",
@@ -520,15 +537,10 @@ def make_message_db_object(message: Message) -> TelegramMessage:
         date=message.date,
         edit_date=message.edit_date,
         business_connection_id=message.business_connection_id,
-        is_topic_message=bool(message.is_topic_message),
-        is_automatic_forward=bool(message.is_automatic_forward),
-        has_media_spoiler=bool(message.has_media_spoiler),
-        has_protected_content=bool(message.has_protected_content),
-        is_from_offline=bool(message.is_from_offline),
-        is_paid_post=bool(message.is_paid_post),
+        flags=get_message_flags(message),
         author_signature=message.author_signature,
         paid_star_count=message.paid_star_count,
-        other_data=other_data or null(),
+        other_data=other_data or None,
     )
 
 
@@ -550,18 +562,13 @@ def bulk_prepare_messages(messages: List[Message]) -> List[Dict[str, Any]]:
             "date": msg.date,
             "edit_date": msg.edit_date,
             "business_connection_id": msg.business_connection_id,
-            "is_topic_message": bool(msg.is_topic_message),
-            "is_automatic_forward": bool(msg.is_automatic_forward),
-            "has_media_spoiler": bool(msg.has_media_spoiler),
-            "has_protected_content": bool(msg.has_protected_content),
-            "is_from_offline": bool(msg.is_from_offline),
-            "is_paid_post": bool(msg.is_paid_post),
+            "flags": get_message_flags(msg),
             "author_signature": msg.author_signature,
             "paid_star_count": msg.paid_star_count,
             "other_data": remove_fields(
                 msg.to_dict(), get_message_excluded_fields(msg), ("file_id",)
             )
-            or null(),
+            or None,
         }
         for msg in messages
     ]
@@ -569,8 +576,8 @@ def bulk_prepare_messages(messages: List[Message]) -> List[Dict[str, Any]]:
 
 async def bulk_insert_messages(db: AsyncSession, messages: List[Message]) -> None:
     dicts = bulk_prepare_messages(messages)
-    stmt = insert(TelegramMessage).values(dicts)
-    await db.execute(stmt)
+    stmt = insert_ignore_conflicts(TelegramMessage, ("id", "chat_id"))
+    await db.execute(stmt, dicts)
 
 
 def bulk_prepare_files(files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -636,6 +643,9 @@ async def log_object(
     unique_users, unique_chats, unique_messages, unique_files_json = collect_entities(
         object
     )
+    if not (unique_users or unique_chats or unique_messages or unique_files_json):
+        return (False, False, False, False, False, False)
+
     chat_ids = list(unique_chats.keys())
     user_ids = list(unique_users.keys())
     message_ids = list(unique_messages.keys())
@@ -1,21 +1,23 @@
 import json
-import re
 from typing import Any, AsyncGenerator, Dict, List, Tuple, Union
 from fastapi import HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 import httpx
 from sqlalchemy import exists, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from telegram import Chat, ChatFullInfo, Message, Update, User as UpdateUser
 
 from app.core.crypto import crypto
+from app.core.http_client import http_client
 from app.core.settings import settings
 from app.core.constants import (
-    BOT_TOKEN_REGEX,
+    BOT_TOKEN_INFO,
+    BOT_TOKEN_RE,
     EDITED_MESSAGE_RETURNED_METHODS,
     MESSAGE_RETURNED_METHODS,
 )
-from app.core.enums import ChatType, CryptoInfo
+from app.core.enums import ChatType
 from app.core.utils import remove_fields
 from app.core.logger import logger
 from app.db.models.telegram.bot import Bot
@@ -281,6 +283,7 @@ async def log_telegram_request(
                         TelegramMessage.chat_id == from_chat_id,
                         TelegramMessage.id.in_(original_message_ids),
                     )
+                    .options(undefer(TelegramMessage.other_data))
                 )
 
                 result = await db.execute(stmt)
@@ -293,12 +296,16 @@ async def log_telegram_request(
                 if chat_exists:
                     chat_id = rows[0][1]
             else:
-                stmt2 = select(
-                    TelegramMessage,
-                    exists().where(TelegramChat.id == chat_id),
-                ).where(
-                    TelegramMessage.chat_id == from_chat_id,
-                    TelegramMessage.id.in_(original_message_ids),
+                stmt2 = (
+                    select(
+                        TelegramMessage,
+                        exists().where(TelegramChat.id == chat_id),
+                    )
+                    .where(
+                        TelegramMessage.chat_id == from_chat_id,
+                        TelegramMessage.id.in_(original_message_ids),
+                    )
+                    .options(undefer(TelegramMessage.other_data))
                 )
                 result = await db.execute(stmt2)
                 rows = result.all()
@@ -402,6 +409,7 @@ async def log_telegram_request(
                     TelegramMessage.id == original_message_id,
                     TelegramMessage.chat_id == from_chat_id,
                 )
+                .options(undefer(TelegramMessage.other_data))
             )
 
             result = await db.execute(stmt3)
@@ -414,12 +422,16 @@ async def log_telegram_request(
             if chat_exists:
                 chat_id = rows[0][1]
         else:
-            stmt4 = select(
-                TelegramMessage,
-                exists().where(TelegramChat.id == chat_id),
-            ).where(
-                TelegramMessage.id == original_message_id,
-                TelegramMessage.chat_id == from_chat_id,
+            stmt4 = (
+                select(
+                    TelegramMessage,
+                    exists().where(TelegramChat.id == chat_id),
+                )
+                .where(
+                    TelegramMessage.id == original_message_id,
+                    TelegramMessage.chat_id == from_chat_id,
+                )
+                .options(undefer(TelegramMessage.other_data))
             )
             result = await db.execute(stmt4)
             rows = result.all()
@@ -467,7 +479,7 @@ async def log_telegram_request(
 
 
 async def verify_token(db: AsyncSession, token: str) -> int:
-    if not token or not re.match(BOT_TOKEN_REGEX, token):
+    if not token or not BOT_TOKEN_RE.fullmatch(token):
         raise HTTPException(status_code=400, detail="Invalid Telegram bot token format")
 
     bot_id = int(token.split(":")[0])
@@ -478,7 +490,7 @@ async def verify_token(db: AsyncSession, token: str) -> int:
         raise HTTPException(status_code=404, detail="Bot not found")
 
     token_stripped = token.split(":", 1)[1]
-    token_decrypted = crypto.decrypt_data(token_db, CryptoInfo.BOT_TOKEN)
+    token_decrypted = await crypto.decrypt_data_async(token_db, BOT_TOKEN_INFO)
 
     if token_stripped != token_decrypted:
         raise HTTPException(status_code=404, detail="Bot not found")
@@ -509,46 +521,42 @@ async def proxy_request(
 
     merged_request: Dict[str, Any] = query_params | body_dict
 
-    async with httpx.AsyncClient(
-        timeout=settings.TELEGRAM_API_REDIRECT_TIMEOUT
-    ) as client:
-        try:
-            resp = await client.request(
-                method=request.method,
-                url=telegram_url,
-                params=query_params,
-                json=body_dict,
-            )
+    try:
+        resp = await http_client.request(
+            method=request.method,
+            url=telegram_url,
+            params=query_params,
+            json=body_dict,
+            timeout=settings.TELEGRAM_API_REDIRECT_TIMEOUT,
+        )
 
-            if resp.status_code == 200:
-                try:
-                    json_response: Dict[str, Any] = resp.json()
-                    if json_response.get("ok"):
-                        result: Union[Dict[str, Any], List[Dict[str, Any]], bool] = (
-                            json_response.get("result", {})
-                        )
-                        await log_telegram_request(
-                            db, merged_request, result, method, bot_id, token
-                        )
-                        await db.commit()
-                except Exception as e:
-                    logger.error(e)
-
-            headers = {
-                k: v
-                for k, v in resp.headers.items()
-                if k.lower()
-                not in ["content-encoding", "transfer-encoding", "content-length"]
-            }
-            return Response(
-                content=resp.content, status_code=resp.status_code, headers=headers
-            )
+        if resp.status_code == 200:
+            try:
+                json_response: Dict[str, Any] = resp.json()
+                if json_response.get("ok"):
+                    result: Union[Dict[str, Any], List[Dict[str, Any]], bool] = (
+                        json_response.get("result", {})
+                    )
+                    await log_telegram_request(
+                        db, merged_request, result, method, bot_id, token
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.error(e)
+
+        headers = {
+            k: v
+            for k, v in resp.headers.items()
+            if k.lower()
+            not in ["content-encoding", "transfer-encoding", "content-length"]
+        }
+        return Response(
+            content=resp.content, status_code=resp.status_code, headers=headers
+        )
 
-        except httpx.RequestError as e:
-            logger.error(e)
-            raise HTTPException(
-                status_code=502, detail="Failed to reach Telegram API"
-            )
+    except httpx.RequestError as e:
+        logger.error(e)
+        raise HTTPException(status_code=502, detail="Failed to reach Telegram API")
 
 
 async def proxy_file_request(
@@ -562,40 +570,37 @@ async def proxy_file_request(
         f"{settings.TELEGRAM_API_FILE_URL}{token}/" f"{file_path.lstrip('/')}"
     )
 
-    async with httpx.AsyncClient(
-        timeout=settings.TELEGRAM_API_REDIRECT_TIMEOUT
-    ) as client:
-        try:
-            resp = await client.get(
-                telegram_file_url, follow_redirects=True
-            )
-
-            if resp.status_code != 200:
-                return Response(
-                    content=resp.content,
-                    status_code=resp.status_code,
-                    media_type=resp.headers.get("content-type"),
-                )
-
-            headers = {
-                k: v
-                for k, v in resp.headers.items()
-                if k.lower() not in ["content-encoding", "transfer-encoding"]
-            }
-
-            async def file_generator() -> AsyncGenerator[bytes, None]:
-                for chunk in resp.iter_bytes(chunk_size=8192):
-                    yield chunk
+    try:
+        resp = await http_client.get(
+            telegram_file_url,
+            follow_redirects=True,
+            timeout=settings.TELEGRAM_API_REDIRECT_TIMEOUT,
+        )
 
-            return StreamingResponse(
-                file_generator(),
-                media_type=resp.headers.get("content-type", "application/octet-stream"),
-                headers=headers,
+        if resp.status_code != 200:
+            return Response(
+                content=resp.content,
                 status_code=resp.status_code,
+                media_type=resp.headers.get("content-type"),
             )
 
-        except httpx.RequestError as e:
-            logger.error(e)
-            raise HTTPException(
-                status_code=502, detail="Failed to reach Telegram API"
-            )
+        headers = {
+            k: v
+            for k, v in resp.headers.items()
+            if k.lower() not in ["content-encoding", "transfer-encoding"]
+        }
+
+        async def file_generator() -> AsyncGenerator[bytes, None]:
+            for chunk in resp.iter_bytes(chunk_size=8192):
+                yield chunk
+
+        return StreamingResponse(
+            file_generator(),
+            media_type=resp.headers.get("content-type", "application/octet-stream"),
+            headers=headers,
+            status_code=resp.status_code,
+        )
+
+    except httpx.RequestError as e:
+        logger.error(e)
+        raise HTTPException(status_code=502, detail="Failed to reach Telegram API")